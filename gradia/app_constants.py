@@ -71,6 +71,13 @@ SUPPORTED_EXPORT_FORMATS = {
         'extensions': ['.png'],
         'save_options': {'keys': [], 'values': []}
     },
+    'png8': {
+        'name': _('Palette PNG Image (*.png)'),
+        'shortname' : 'PNG (256 Colors)',
+        'mime_type': 'image/png',
+        'extensions': ['.png'],
+        'save_options': {'keys': [], 'values': []}
+    },
     'jpeg': {
         'name': _('JPEG Image (*.jpg)'),
         'shortname' : 'JPEG',
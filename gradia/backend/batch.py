@@ -0,0 +1,263 @@
+# Copyright (C) 2025 Alexander Vanhee
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import dataclasses
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional
+
+from gradia.backend.logger import Logger
+from gradia.backend.settings import Settings
+from gradia.backend.tracing import get_trace_path_from_env, span, tracer
+from gradia.graphics.background import Background
+from gradia.graphics.gradient import GradientBackground
+from gradia.graphics.image import ImageBackground
+from gradia.graphics.image_processor import ImageProcessor
+from gradia.graphics.loaded_image import LoadedImage, ImageOrigin
+from gradia.graphics.png_writer import PngWriter
+from gradia.graphics.solid import SolidBackground
+from gradia.ui.image_loaders import BaseImageLoader
+from gradia.utils.aspect_ratio import parse_aspect_ratio, check_aspect_ratio_bounds
+
+logger = Logger()
+
+BATCH_USAGE = "Usage: gradia --batch [--jobs=N] INPUT_DIR OUTPUT_DIR"
+
+
+@dataclass(frozen=True)
+class BatchOptions:
+    background: Optional[Background]
+    padding: int
+    corner_radius: int
+    aspect_ratio: Optional[float]
+    shadow_strength: int
+    auto_balance: bool
+    rotation: int
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> 'BatchOptions':
+        """The image options as the sidebar restores them on startup."""
+        mode = settings.background_mode
+        if mode == "none":
+            return cls(None, 0, 0, None, 0, settings.image_auto_balance, settings.image_rotation)
+
+        if mode == "solid":
+            background = SolidBackground.from_json(settings.solid_state or '{}')
+        elif mode == "image":
+            background = ImageBackground()
+        else:
+            background = GradientBackground.from_json(settings.gradient_state or '{}')
+
+        aspect_ratio = None
+        try:
+            ratio = parse_aspect_ratio(settings.image_aspect_ratio)
+            if ratio is not None and check_aspect_ratio_bounds(ratio):
+                aspect_ratio = ratio
+        except ValueError as e:
+            logger.warning(f"Ignoring invalid aspect ratio {settings.image_aspect_ratio}: {e}")
+
+        return cls(
+            background=background,
+            padding=settings.image_padding,
+            corner_radius=settings.image_corner_radius,
+            aspect_ratio=aspect_ratio,
+            shadow_strength=settings.image_shadow_strength,
+            auto_balance=settings.image_auto_balance,
+            rotation=settings.image_rotation
+        )
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    input_path: str
+    output_path: str
+    pixels: int = 0
+    error: Optional[str] = None
+    trace_events: Optional[list[dict]] = None
+
+
+_worker_options: Optional[BatchOptions] = None
+
+
+def run_batch(args: list[str]) -> int:
+    """
+    Run `gradia --batch`, rendering every supported image in the input
+    directory with the saved image options into the output directory.
+
+    Images are rendered at full resolution on a pool of processes and no
+    window is created, so this also works without a display.
+    """
+    try:
+        input_dir, output_dir, jobs = _parse_batch_args(args)
+    except ValueError as e:
+        print(e)
+        print(BATCH_USAGE)
+        return 2
+
+    input_paths = _collect_inputs(input_dir)
+    if not input_paths:
+        print(f"No supported images found in {input_dir}")
+        return 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    options = BatchOptions.from_settings(Settings())
+    jobs = min(jobs, len(input_paths))
+
+    # Workers are forked so they inherit the options and loaded libraries;
+    # they only run Pillow code and never touch GLib.
+    context = multiprocessing.get_context("fork")
+    failures = 0
+    processed_pixels = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(jobs, mp_context=context, initializer=_init_worker, initargs=(options,)) as pool:
+        futures = [
+            pool.submit(_process_file, path, output_path)
+            for path, output_path in zip(input_paths, _get_output_paths(input_paths, output_dir))
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.trace_events:
+                tracer.add_events(result.trace_events)
+            if result.error:
+                failures += 1
+                print(f"FAILED {result.input_path}: {result.error}")
+            else:
+                processed_pixels += result.pixels
+                print(f"{result.input_path} -> {result.output_path}")
+
+    elapsed = time.perf_counter() - start
+    succeeded = len(input_paths) - failures
+    print(
+        f"Processed {succeeded} of {len(input_paths)} images with {jobs} jobs in {elapsed:.2f}s "
+        f"({succeeded / elapsed:.2f} images/s, {processed_pixels / elapsed / 1e6:.1f} MP/s)"
+    )
+
+    trace_path = get_trace_path_from_env()
+    if trace_path and tracer.enabled:
+        tracer.dump(trace_path)
+        print(f"Wrote trace to {trace_path}")
+
+    return 1 if failures else 0
+
+
+def _parse_batch_args(args: list[str]) -> tuple[str, str, int]:
+    jobs = os.cpu_count() or 1
+    paths = []
+
+    for arg in args:
+        if arg == "--batch":
+            continue
+        if arg.startswith("--jobs="):
+            try:
+                jobs = int(arg.split("=", 1)[1])
+            except ValueError:
+                raise ValueError(f"Invalid number of jobs: {arg}")
+            if jobs < 1:
+                raise ValueError("The number of jobs must be at least 1")
+        elif arg.startswith("--"):
+            raise ValueError(f"Unknown batch option: {arg}")
+        else:
+            paths.append(arg)
+
+    if len(paths) != 2:
+        raise ValueError("Expected an input and an output directory")
+    if not os.path.isdir(paths[0]):
+        raise ValueError(f"Input directory not found: {paths[0]}")
+
+    return paths[0], paths[1], jobs
+
+
+def _collect_inputs(input_dir: str) -> list[str]:
+    extensions = tuple(ext for ext, _mime in BaseImageLoader.SUPPORTED_INPUT_FORMATS)
+    return sorted(
+        os.path.join(input_dir, name)
+        for name in os.listdir(input_dir)
+        if name.lower().endswith(extensions) and os.path.isfile(os.path.join(input_dir, name))
+    )
+
+
+def _get_output_paths(input_paths: list[str], output_dir: str) -> list[str]:
+    """
+    A distinct PNG path in `output_dir` for every input, named after it.
+
+    Inputs that only differ by extension keep it, so `a.jpg` and `a.png`
+    become `a.jpg.png` and `a.png.png` instead of overwriting each other.
+    """
+    names = [os.path.basename(path) for path in input_paths]
+    stem_counts = Counter(os.path.splitext(name)[0] for name in names)
+
+    output_paths = []
+    used: set[str] = set()
+    for name in names:
+        stem = os.path.splitext(name)[0]
+        base = stem if stem_counts[stem] == 1 else name
+        candidate = f"{base}.png"
+        suffix = 2
+        while candidate in used:
+            candidate = f"{base} ({suffix}).png"
+            suffix += 1
+        used.add(candidate)
+        output_paths.append(os.path.join(output_dir, candidate))
+    return output_paths
+
+
+def _init_worker(options: BatchOptions) -> None:
+    global _worker_options
+    _worker_options = options
+
+
+def _process_file(input_path: str, output_path: str) -> BatchResult:
+    with span("batch-file", path=input_path):
+        result = _render_file(input_path, output_path)
+    # Workers are separate processes, so their spans travel back with the result.
+    if tracer.enabled:
+        return dataclasses.replace(result, trace_events=tracer.take_events())
+    return result
+
+
+def _render_file(input_path: str, output_path: str) -> BatchResult:
+    try:
+        image = LoadedImage(input_path, ImageOrigin.CommandLine)
+        if not image.is_loaded:
+            return BatchResult(input_path, output_path, error=image.load_error)
+
+        options = _worker_options
+        processor = ImageProcessor(
+            image=image,
+            background=options.background,
+            padding=options.padding,
+            aspect_ratio=options.aspect_ratio,
+            corner_radius=options.corner_radius,
+            shadow_strength=options.shadow_strength,
+            auto_balance=options.auto_balance,
+            rotation=options.rotation
+        )
+        result = processor.process_full_resolution_to_pillow().convert("RGBA")
+
+        with span("encode-png"), open(output_path, "wb") as output:
+            writer = PngWriter(output.write, result.width, result.height)
+            writer.write_rows(result.tobytes(), result.width * 4, result.height)
+            writer.close()
+
+        return BatchResult(input_path, output_path, pixels=result.width * result.height)
+    except Exception as e:
+        return BatchResult(input_path, output_path, error=str(e))
@@ -0,0 +1,155 @@
+# Copyright (C) 2025 Alexander Vanhee
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import threading
+from collections.abc import Callable
+from typing import Any, Optional
+
+from gi.repository import Gio, GLib
+
+from gradia.backend.logger import Logger
+
+logger = Logger()
+
+# Niceness added to speculative render threads, so they yield to the UI and to real exports.
+SPECULATIVE_NICENESS = 10
+
+
+class RenderScheduler:
+    """
+    Runs renders on at most one worker thread at a time.
+
+    Requests made while a render is in flight are coalesced into a single
+    follow-up render, and results that were superseded before they could be
+    shown are dropped. Only the newest result reaches `publish`, which is
+    always called on the main loop.
+    """
+
+    def __init__(self, render: Callable[[], Any], publish: Callable[[Any], None]) -> None:
+        self._render = render
+        self._publish = publish
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pending = False
+        self._running = False
+        self._callbacks: list[Callable[[], None]] = []
+
+    def request(self, callback: Optional[Callable[[], None]] = None) -> None:
+        self._request([callback] if callback else [])
+
+    def _request(self, callbacks: list[Callable[[], None]]) -> None:
+        with self._lock:
+            self._generation += 1
+            self._pending = True
+            self._callbacks.extend(callbacks)
+            if self._running:
+                return
+            self._running = True
+
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
+                generation = self._generation
+
+            try:
+                result = self._render()
+            except Exception as e:
+                logger.error(f"Error processing image: {e}")
+                continue
+
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                callbacks = self._callbacks
+                self._callbacks = []
+
+            GLib.idle_add(self._finish, generation, result, callbacks, priority=GLib.PRIORITY_DEFAULT)
+
+    def _finish(self, generation: int, result: Any, callbacks: list[Callable[[], None]]) -> bool:
+        with self._lock:
+            stale = generation != self._generation
+        if stale:
+            # The newer render may already have finished, so request one that is sure to publish.
+            if callbacks:
+                self._request(callbacks)
+            return False
+
+        self._publish(result)
+        for callback in callbacks:
+            callback()
+        return False
+
+
+class SpeculativeRenderer:
+    """
+    Runs a render whose result is not needed yet, once requests have been
+    quiet for `delay_ms`.
+
+    Every `schedule` restarts the delay, and `cancel` stops both a pending
+    and a running render; the render receives a Gio.Cancellable it should
+    check between steps. Renders run on a low priority thread and nothing
+    is published, so they are only useful for warming caches.
+    """
+
+    def __init__(self, render: Callable[[Gio.Cancellable], None], delay_ms: int = 750) -> None:
+        self._render = render
+        self._delay_ms = delay_ms
+        self._timeout_id: Optional[int] = None
+        self._cancellable: Optional[Gio.Cancellable] = None
+
+    def schedule(self) -> None:
+        self.cancel()
+        self._timeout_id = GLib.timeout_add(self._delay_ms, self._start, priority=GLib.PRIORITY_LOW)
+
+    def cancel(self) -> None:
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+        if self._cancellable is not None:
+            self._cancellable.cancel()
+            self._cancellable = None
+
+    def _start(self) -> bool:
+        self._timeout_id = None
+        self._cancellable = Gio.Cancellable()
+        threading.Thread(
+            target=self._run, args=(self._cancellable,), name="speculative-render", daemon=True
+        ).start()
+        return False
+
+    def _run(self, cancellable: Gio.Cancellable) -> None:
+        try:
+            # Linux applies the niceness of a thread id to that thread only.
+            thread_id = threading.get_native_id()
+            os.setpriority(os.PRIO_PROCESS, thread_id, os.getpriority(os.PRIO_PROCESS, thread_id) + SPECULATIVE_NICENESS)
+        except (AttributeError, OSError):
+            pass
+
+        try:
+            self._render(cancellable)
+        except GLib.Error as e:
+            if not cancellable.is_cancelled():
+                logger.error(f"Error in speculative render: {e}")
+        except Exception as e:
+            logger.error(f"Error in speculative render: {e}")
@@ -83,6 +83,35 @@ class Settings:
     def export_compress(self) -> bool:
         return self._settings.get_boolean("export-compress")
 
+    @property
+    def png_compression_preset(self) -> str:
+        value = self._settings.get_string("png-compression-preset")
+        if value in ("fast", "balanced", "small"):
+            return value
+        return "balanced"
+
+    @png_compression_preset.setter
+    def png_compression_preset(self, value: str) -> None:
+        if value not in ("fast", "balanced", "small"):
+            value = "balanced"
+        self._settings.set_string("png-compression-preset", value)
+
+    @property
+    def png_palette_dither(self) -> bool:
+        return self._settings.get_boolean("png-palette-dither")
+
+    @property
+    def upload_size_budget(self) -> int:
+        return max(0, self._settings.get_int("upload-size-budget"))
+
+    @property
+    def export_tile_budget(self) -> int:
+        return max(1, self._settings.get_int("export-tile-budget"))
+
+    @property
+    def resident_image_budget(self) -> int:
+        return max(1, self._settings.get_int("resident-image-budget"))
+
     @property
     def delete_screenshots_on_close(self) -> bool:
         return self._settings.get_boolean("trash-screenshots-on-close")
@@ -0,0 +1,157 @@
+# Copyright (C) 2025 Alexander Vanhee
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import functools
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from contextlib import nullcontext
+from typing import Any, Optional
+
+# Set to a file path to record spans from startup and write them there on exit.
+TRACE_ENV = "GRADIA_TRACE"
+
+_NULL_SPAN = nullcontext()
+
+
+class Tracer:
+    """
+    Records timed spans as Chrome trace events.
+
+    Spans are only recorded while tracing is enabled; otherwise `span()`
+    returns a shared no-op context manager, so disabled tracing costs one
+    attribute check per span. The dump can be opened in
+    chrome://tracing or Perfetto, with one track per thread.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._events: list[dict[str, Any]] = []
+        self._named_threads: set[int] = set()
+        self._origin_ns = time.perf_counter_ns()
+
+    def start(self) -> None:
+        with self._lock:
+            self._events = []
+            self._named_threads = set()
+            self._origin_ns = time.perf_counter_ns()
+        self.enabled = True
+
+    def stop(self) -> list[dict[str, Any]]:
+        self.enabled = False
+        with self._lock:
+            events, self._events = self._events, []
+            self._named_threads = set()
+        return events
+
+    def take_events(self) -> list[dict[str, Any]]:
+        """Remove and return the events recorded so far, without stopping."""
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def add_events(self, events: list[dict[str, Any]]) -> None:
+        """Merge events recorded by another process, such as a batch worker."""
+        with self._lock:
+            self._events.extend(events)
+
+    def dump(self, path: str) -> int:
+        """Stop tracing and write the recorded events to `path`, returning how many there were."""
+        events = self.stop()
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+        return len(events)
+
+    def _record(self, name: str, start_ns: int, end_ns: int, args: dict[str, Any]) -> None:
+        thread_id = threading.get_native_id()
+        event = {
+            "name": name,
+            "cat": "gradia",
+            "ph": "X",
+            "ts": (start_ns - self._origin_ns) / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": thread_id,
+        }
+        if args:
+            event["args"] = args
+
+        with self._lock:
+            if thread_id not in self._named_threads:
+                self._named_threads.add(thread_id)
+                self._events.append({
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": thread_id,
+                    "args": {"name": threading.current_thread().name},
+                })
+            self._events.append(event)
+
+
+class _Span:
+    __slots__ = ("_tracer", "_name", "_args", "_start_ns")
+
+    def __init__(self, tracer: Tracer, name: str, args: dict[str, Any]) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._start_ns = 0
+
+    def __enter__(self) -> "_Span":
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._tracer._record(self._name, self._start_ns, time.perf_counter_ns(), self._args)
+
+
+tracer = Tracer()
+
+
+def span(name: str, **args: Any) -> Any:
+    """Time the enclosed block as a span named `name`, when tracing is enabled."""
+    if not tracer.enabled:
+        return _NULL_SPAN
+    return _Span(tracer, name, args)
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Decorator that records every call of the function as a span."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with _Span(tracer, span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+def get_trace_path_from_env() -> Optional[str]:
+    return os.environ.get(TRACE_ENV) or None
+
+
+if get_trace_path_from_env():
+    tracer.start()
@@ -16,7 +16,10 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import os
-from gi.repository import Gdk, GLib, GdkPixbuf
+import threading
+from collections.abc import Callable, Iterable
+from typing import Optional
+from gi.repository import Gdk, Gio, GLib, GdkPixbuf
 
 def save_texture_to_file(texture, temp_dir: str) -> str:
     temp_path: str = os.path.join(temp_dir, f"clipboard_image_{os.urandom(6).hex()}.png")
@@ -42,12 +45,102 @@ def copy_text_to_clipboard(text: str) -> None:
     content_provider = Gdk.ContentProvider.new_for_bytes("text/plain;charset=utf-8", bytes_data)
     clipboard.set_content(content_provider)
 
-def copy_pixbuf_to_clipboard(pixbuf: GdkPixbuf.Pixbuf) -> None:
+class ImageContentProvider(Gdk.ContentProvider):
+    """
+    Clipboard content that is only encoded once a format is asked for.
+
+    Each mime type is encoded at most once, by `encode` on a worker thread,
+    so a paste never blocks the main loop. Formats that are already
+    encoded can be passed in `encoded`.
+    """
+    __gtype_name__ = "GradiaImageContentProvider"
+
+    def __init__(
+        self,
+        mime_types: Iterable[str],
+        encode: Callable[[str], bytes],
+        encoded: Optional[dict[str, bytes]] = None
+    ) -> None:
+        super().__init__()
+        self._mime_types = list(mime_types)
+        self._encode = encode
+        self._encoded = dict(encoded or {})
+        self._lock = threading.Lock()
+
+    def do_ref_formats(self) -> Gdk.ContentFormats:
+        builder = Gdk.ContentFormatsBuilder.new()
+        for mime_type in self._mime_types:
+            builder.add_mime_type(mime_type)
+        return builder.to_formats()
+
+    def do_write_mime_type_async(self, mime_type, stream, io_priority, cancellable, callback, user_data=None) -> None:
+        task = Gio.Task.new(self, cancellable, callback, user_data)
+        task.set_priority(io_priority)
+        if mime_type not in self._mime_types:
+            task.return_error(GLib.Error.new_literal(
+                Gio.io_error_quark(), f"Cannot provide {mime_type}", int(Gio.IOErrorEnum.NOT_SUPPORTED)
+            ))
+            return
+
+        def write_thread(task, source_object, task_data, cancellable):
+            try:
+                stream.write_all(self._get_encoded(mime_type), cancellable)
+                task.return_boolean(True)
+            except GLib.Error as e:
+                task.return_error(e)
+            except Exception as e:
+                task.return_error(GLib.Error.new_literal(Gio.io_error_quark(), str(e), 0))
+
+        task.run_in_thread(write_thread)
+
+    def do_write_mime_type_finish(self, result: Gio.AsyncResult) -> bool:
+        return result.propagate_boolean()
+
+    def _get_encoded(self, mime_type: str) -> bytes:
+        with self._lock:
+            data = self._encoded.get(mime_type)
+            if data is None:
+                data = self._encode(mime_type)
+                self._encoded[mime_type] = data
+            return data
+
+def copy_pixbuf_to_clipboard(
+    pixbuf: GdkPixbuf.Pixbuf,
+    encoded_provider: Optional[Gdk.ContentProvider] = None
+) -> Optional[Gdk.Clipboard]:
     display = Gdk.Display.get_default()
     if not display:
         print("Warning: Failed to retrieve `Gdk.Display` object.")
-        return
+        return None
 
     clipboard: Gdk.Clipboard = display.get_clipboard()
     content_provider: Gdk.ContentProvider = Gdk.ContentProvider.new_for_value(pixbuf)
+    if encoded_provider is not None:
+        # Encoded formats are offered first; any other format is still serialized from the pixbuf.
+        content_provider = Gdk.ContentProvider.new_union([encoded_provider, content_provider])
     clipboard.set_content(content_provider)
+    return clipboard
+
+def hand_off_clipboard(clipboard: Gdk.Clipboard, callback: Callable[[], None]) -> None:
+    """
+    Call `callback` once the clipboard content no longer needs this process:
+    when a clipboard manager stored it, or, without one, when another
+    application takes over the clipboard.
+    """
+    def on_changed(clipboard: Gdk.Clipboard) -> None:
+        if not clipboard.is_local():
+            clipboard.disconnect(handler_ids.pop())
+            callback()
+
+    def on_stored(clipboard: Gdk.Clipboard, result: Gio.AsyncResult) -> None:
+        try:
+            clipboard.store_finish(result)
+        except GLib.Error as e:
+            print(f"Clipboard content was not stored, serving it until replaced: {e.message}")
+            if clipboard.is_local():
+                handler_ids.append(clipboard.connect("changed", on_changed))
+                return
+        callback()
+
+    handler_ids: list[int] = []
+    clipboard.store_async(GLib.PRIORITY_DEFAULT, None, on_stored)
@@ -50,3 +50,18 @@ class Background(ABC):
             str: A unique name for this background configuration
         """
         pass
+
+    def prepare_band(self, width: int, height: int, top: int, bottom: int) -> Image.Image:
+        """
+        Prepare rows [top, bottom) of the background for the given size.
+
+        The default crops the full background. Backgrounds that can render
+        rows independently should override this to avoid the full image.
+
+        Returns:
+            PIL.Image: The background rows
+        """
+        image = self.prepare_image(width, height)
+        if image is None:
+            return None
+        return image.crop((0, top, width, bottom))
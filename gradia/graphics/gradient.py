@@ -21,6 +21,7 @@ import json
 
 from PIL import Image
 
+from gradia.backend.tracing import span
 from gradia.graphics.background import Background
 from gradia.utils.colors import parse_rgb_string
 
@@ -106,6 +107,13 @@ class GradientBackground(Background):
             c_double, c_int
         ]
         cls._c_lib.generate_gradient.restype = None
+        cls._c_lib.generate_gradient_rows.argtypes = [
+            POINTER(c_uint8), c_int, c_int,
+            c_int, c_int,
+            POINTER(ColorStop), c_int,
+            c_double, c_int
+        ]
+        cls._c_lib.generate_gradient_rows.restype = None
 
     @classmethod
     def from_json(cls, json_str: str) -> 'GradientBackground':
@@ -115,15 +123,22 @@ class GradientBackground(Background):
         return self.gradient.to_json()
 
     def get_name(self) -> str:
-        return "Gradient"
+        return f"gradient-{self.gradient.to_json()}"
 
     def prepare_image(self, width: int, height: int) -> Image.Image:
         if self._c_lib is None:
             raise RuntimeError("C gradient library not loaded")
         return self._generate_gradient_c(width, height)
 
-    def _generate_gradient_c(self, width: int, height: int) -> Image.Image:
-        pixel_count = width * height * 4
+    def prepare_band(self, width: int, height: int, top: int, bottom: int) -> Image.Image:
+        if self._c_lib is None:
+            raise RuntimeError("C gradient library not loaded")
+        return self._generate_gradient_c(width, height, top, bottom)
+
+    def _generate_gradient_c(self, width: int, height: int, top: int = 0, bottom: Optional[int] = None) -> Image.Image:
+        if bottom is None:
+            bottom = height
+        pixel_count = width * (bottom - top) * 4
         pixel_buffer = (c_uint8 * pixel_count)()
 
         steps = self.gradient.steps
@@ -148,12 +163,14 @@ class GradientBackground(Background):
 
         mode = mode_map.get(self.gradient.mode, 0)
 
-        self._c_lib.generate_gradient(
-            pixel_buffer, width, height,
-            stop_array, len(parsed_stops),
-            float(self.gradient.angle),
-            mode
-        )
+        with span("generate-gradient", mode=self.gradient.mode, rows=bottom - top):
+            self._c_lib.generate_gradient_rows(
+                pixel_buffer, width, height,
+                top, bottom - top,
+                stop_array, len(parsed_stops),
+                float(self.gradient.angle),
+                mode
+            )
 
-        return Image.frombytes("RGBA", (width, height), bytes(pixel_buffer))
+        return Image.frombytes("RGBA", (width, bottom - top), bytes(pixel_buffer))
 
@@ -28,8 +28,11 @@ static void interpolate_color(double t, const ColorStop* stops, int num_stops, u
     *out_b = stops[num_stops - 1].b;
 }
 
-void generate_gradient(
+// Fills rows [first_row, first_row + row_count) of a width x height gradient.
+// `pixels` only holds those rows, so large gradients can be generated in bands.
+void generate_gradient_rows(
     uint8_t* pixels, int width, int height,
+    int first_row, int row_count,
     const ColorStop* stops, int num_stops,
     double angle, int mode // 0 = linear, 1 = conic, 2 = radial
 ) {
@@ -59,7 +62,7 @@ void generate_gradient(
     double cy = height / 2.0;
     double max_radius = sqrt(cx * cx + cy * cy);
 
-    for (int y = 0; y < height; y++) {
+    for (int y = first_row; y < first_row + row_count; y++) {
         for (int x = 0; x < width; x++) {
             double t;
 
@@ -85,7 +88,7 @@ void generate_gradient(
             uint8_t r, g, b;
             interpolate_color(t, stops, num_stops, &r, &g, &b);
 
-            int idx = (y * width + x) * 4;
+            int idx = ((y - first_row) * width + x) * 4;
             pixels[idx] = r;
             pixels[idx + 1] = g;
             pixels[idx + 2] = b;
@@ -93,3 +96,11 @@ void generate_gradient(
         }
     }
 }
+
+void generate_gradient(
+    uint8_t* pixels, int width, int height,
+    const ColorStop* stops, int num_stops,
+    double angle, int mode
+) {
+    generate_gradient_rows(pixels, width, height, 0, height, stops, num_stops, angle, mode);
+}
@@ -31,6 +31,8 @@ from gradia.graphics.background import Background
 from gradia.ui.widget.preset_button import ImagePresetButton
 from gradia.app_constants import PRESET_IMAGES
 
+RESAMPLE_CHUNK_ROWS = 256
+
 class ImageBackground(Background):
     @property
     def SAVED_IMAGE_PATH(self) -> Path:
@@ -75,11 +77,47 @@ class ImageBackground(Background):
         thread.start()
 
     def prepare_image(self, width: int, height: int) -> Optional[Image.Image]:
+        return self.prepare_band(width, height, 0, height)
+
+    def prepare_band(self, width: int, height: int, top: int, bottom: int) -> Optional[Image.Image]:
+        # The cover is always resampled in the same fixed chunks of rows, so a
+        # band has exactly the pixels of the full background without building it.
         if not self.image:
             return None
 
+        first = top - top % RESAMPLE_CHUNK_ROWS
+        chunks = [
+            self._resample_rows(width, height, chunk_top, min(height, chunk_top + RESAMPLE_CHUNK_ROWS))
+            for chunk_top in range(first, bottom, RESAMPLE_CHUNK_ROWS)
+        ]
+        if len(chunks) == 1 and first == top and chunks[0].height == bottom - top:
+            return chunks[0]
+
+        band = Image.new("RGBA", (width, sum(chunk.height for chunk in chunks)))
+        offset = 0
+        for chunk in chunks:
+            band.paste(chunk, (0, offset))
+            offset += chunk.height
+        return band.crop((0, top - first, width, bottom - first))
+
+    def _resample_rows(self, width: int, height: int, top: int, bottom: int) -> Image.Image:
         img = self.image
-        img_ratio = img.width / img.height
+        new_width, new_height = self._get_cover_size(width, height)
+        scale_x = img.width / new_width
+        scale_y = img.height / new_height
+        left = (new_width - width) // 2
+        offset_y = (new_height - height) // 2
+
+        box = (
+            left * scale_x,
+            (offset_y + top) * scale_y,
+            (left + width) * scale_x,
+            (offset_y + bottom) * scale_y,
+        )
+        return img.resize((width, bottom - top), Image.Resampling.LANCZOS, box=box)
+
+    def _get_cover_size(self, width: int, height: int) -> tuple[int, int]:
+        img_ratio = self.image.width / self.image.height
         target_ratio = width / height
 
         if img_ratio > target_ratio:
@@ -88,15 +126,7 @@ class ImageBackground(Background):
         else:
             new_width = width
             new_height = int(new_width / img_ratio)
-
-        img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        left = (new_width - width) // 2
-        top = (new_height - height) // 2
-        right = left + width
-        bottom = top + height
-
-        img_cropped = img_resized.crop((left, top, right, bottom))
-        return img_cropped
+        return new_width, new_height
 
     def get_name(self) -> str:
         return f"image-{self.file_path or 'none'}"
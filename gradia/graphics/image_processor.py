@@ -14,13 +14,20 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
-from typing import Optional
+import copy
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterator
+from typing import Any, Optional
 
-from PIL import Image, ImageChops, ImageDraw, ImageFilter
-from gi.repository import GdkPixbuf
+from PIL import Image
+from gi.repository import GdkPixbuf, Gio, GLib
 
+from gradia.backend.tracing import span, traced
 from gradia.graphics.background import Background
-from gradia.graphics.loaded_image import LoadedImage, BalancedPadding
+from gradia.graphics.loaded_image import LoadedImage, BalancedPadding, resident_images
+from gradia.graphics.rounded_rect import create_rounded_rect_shadow, round_corners
+from gradia.graphics.shadow import create_drop_shadow
 
 
 class ImageProcessor:
@@ -43,6 +50,11 @@ class ImageProcessor:
         self.auto_balance: bool = auto_balance
         self.rotation: int = rotation
         self._loaded_image: Optional[LoadedImage] = None
+        self._stage_cache: dict[tuple[str, str], tuple[Hashable, Any]] = {}
+        self._cache_lock = threading.Lock()
+        self._full_res_lock = threading.Lock()
+        self._full_res_result: Optional[tuple[Hashable, GdkPixbuf.Pixbuf]] = None
+        self.stage_timings: dict[str, float] = {}
 
         if image:
             self.set_image(image)
@@ -50,80 +62,365 @@ class ImageProcessor:
     def set_image(self, image: LoadedImage) -> None:
         if not image.is_loaded:
             raise ValueError(f"Failed to load image: {image.load_error}")
+        if image is not self._loaded_image:
+            self.clear_cache()
+            image.connect_spilled(self._on_image_spilled)
         self._loaded_image = image
 
-    def process_to_pillow(self) -> Image:
+    def snapshot(self) -> 'ImageProcessor':
+        """
+        A processor with the current options that shares this one's image and
+        stage caches, so it renders consistently while the options change.
+        """
+        return copy.copy(self)
+
+    def process_to_pillow(self) -> Image.Image:
         if not self._loaded_image or not self._loaded_image.preview_image:
             raise ValueError("No image loaded to process")
-        source_img = self._loaded_image.preview_image.copy()
+        return self._render(full_res=False)
 
-        if self.rotation != 0:
-            source_img = self._apply_rotation(source_img)
-        width, height = source_img.size
+    def process(self) -> tuple[GdkPixbuf.Pixbuf, int, int]:
+        final_img = self.process_to_pillow()
+        final_pixbuf = self._pil_to_pixbuf(final_img)
+        full_width, full_height = self.get_full_resolution_dimensions(final_pixbuf)
+        return final_pixbuf, full_width, full_height
 
-        if self.auto_balance and self._loaded_image.balanced_padding:
-            source_img = self._apply_auto_balance(source_img, self._loaded_image.balanced_padding)
-            width, height = source_img.size
+    def process_full_resolution(self, cancellable: Optional[Gio.Cancellable] = None) -> GdkPixbuf.Pixbuf:
+        """
+        Render the full resolution image, reusing the previous result when
+        no option changed since.
 
-        if self.padding < 0:
-            source_img = self._crop_image(source_img)
-            width, height = source_img.size
+        Full resolution renders run one at a time, so an export that starts
+        during a speculative render waits for it and then reuses its result.
+        Raises GLib.Error when `cancellable` is cancelled between stages.
+        """
+        if not self._loaded_image or not self._loaded_image.full_res_image:
+            raise ValueError("No full resolution image loaded to process")
 
-        if self.corner_radius > 0:
-            source_img = self._apply_rounded_corners(source_img)
+        with self._full_res_lock:
+            key = self.get_render_key()
+            if self._full_res_result is not None and self._full_res_result[0] == key:
+                return self._full_res_result[1]
+
+            try:
+                if self.is_identity():
+                    image = self._loaded_image.full_res_image
+                else:
+                    image = self._render(full_res=True, cancellable=cancellable)
+                pixbuf = self._pil_to_pixbuf(image)
+            finally:
+                # Options are applied on the preview thread; stages they changed under are not reused.
+                changed = self.get_render_key() != key
+                if changed:
+                    self._clear_stages("full")
+
+            if not changed:
+                self._full_res_result = (key, pixbuf)
+            self._account_full_resolution()
+            return pixbuf
+
+    def process_full_resolution_region(
+        self, box: tuple[int, int, int, int], cancellable: Optional[Gio.Cancellable] = None
+    ) -> GdkPixbuf.Pixbuf:
+        """
+        Render only the `box` (left, top, right, bottom) of the full
+        resolution image, with the same pixels as cropping the whole render.
+
+        The source and shadow layers are still prepared at full size, but the
+        background and the composite only cover the box.
+        """
+        if not self._loaded_image or not self._loaded_image.full_res_image:
+            raise ValueError("No full resolution image loaded to process")
 
-        padded_width, padded_height = self._calculate_final_dimensions(width, height)
-        final_img = self._create_background(padded_width, padded_height)
-        paste_position = self._get_paste_position(width, height, padded_width, padded_height)
+        left, top, right, bottom = box
+        with self._full_res_lock:
+            if self._full_res_result is not None and self._full_res_result[0] == self.get_render_key():
+                return GdkPixbuf.Pixbuf.new_subpixbuf(self._full_res_result[1], left, top, right - left, bottom - top)
+
+        source_img, paste_position, shadow_img, shadow_position, padded_size = self._render_layers(True, cancellable)
+        width, height = padded_size
+        if box == (0, 0, width, height):
+            return self.process_full_resolution(cancellable)
+        if cancellable:
+            cancellable.set_error_if_cancelled()
+
+        with span("render-region", width=right - left, height=bottom - top):
+            region = self._create_background_region(width, height, box)
+            region = self._alpha_composite_at_position(
+                region, shadow_img, (shadow_position[0] - left, shadow_position[1] - top), opaque=False
+            )
+            region = self._alpha_composite_at_position(
+                region, source_img, (paste_position[0] - left, paste_position[1] - top)
+            )
+        self._account_full_resolution()
+        return self._pil_to_pixbuf(region)
+
+    def process_full_resolution_to_pillow(self) -> Image.Image:
+        if not self._loaded_image or not self._loaded_image.full_res_image:
+            raise ValueError("No full resolution image loaded to process")
+        try:
+            return self._render(full_res=True)
+        finally:
+            self._account_full_resolution()
+
+    def estimate_full_resolution_size(self) -> tuple[int, int]:
+        """
+        An upper bound of `get_full_resolution_size()` that needs neither the
+        decoded pixels nor any render stage. Cropping is not accounted for.
+        """
+        if not self._loaded_image or not self._loaded_image.full_res_size:
+            raise ValueError("No full resolution image loaded to process")
+        width, height = self._loaded_image.full_res_size
+        if self.rotation in (90, 270):
+            width, height = height, width
+        return self._calculate_final_dimensions(width, height)
 
-        shadow_img, shadow_offset = self._create_shadow(source_img, offset=(10, 10), shadow_strength=self.shadow_strength)
-        shadow_position = (paste_position[0] - shadow_offset[0], paste_position[1] - shadow_offset[1])
+    def get_full_resolution_size(self, cancellable: Optional[Gio.Cancellable] = None) -> tuple[int, int]:
+        if not self._loaded_image or not self._loaded_image.full_res_image:
+            raise ValueError("No full resolution image loaded to process")
+        try:
+            return self._render_layers(True, cancellable)[4]
+        finally:
+            self._account_full_resolution()
+
+    def process_full_resolution_bands(
+        self, band_height: int, cancellable: Optional[Gio.Cancellable] = None
+    ) -> Iterator[GdkPixbuf.Pixbuf]:
+        """
+        Render the full resolution image as consecutive bands of at most
+        `band_height` rows, from top to bottom.
+
+        Only the current band of the canvas is held in memory. The pixels are
+        the same as those of `process_full_resolution`. Raises GLib.Error when
+        `cancellable` is cancelled between stages or bands.
+        """
+        if not self._loaded_image or not self._loaded_image.full_res_image:
+            raise ValueError("No full resolution image loaded to process")
 
-        final_img = self._alpha_composite_at_position(final_img, shadow_img, shadow_position)
-        final_img = self._alpha_composite_at_position(final_img, source_img, paste_position)
+        source_img, paste_position, shadow_img, shadow_position, padded_size = self._render_layers(True, cancellable)
+        width, height = padded_size
+        if band_height >= height:
+            yield self.process_full_resolution(cancellable)
+            return
+
+        try:
+            source_opaque = source_img.getextrema()[3][0] == 255
+            for top in range(0, height, max(1, band_height)):
+                bottom = min(height, top + max(1, band_height))
+                if cancellable:
+                    cancellable.set_error_if_cancelled()
+                with span("render-band", top=top, rows=bottom - top):
+                    band = self._create_background_band(width, height, top, bottom)
+                    band = self._alpha_composite_at_position(
+                        band, shadow_img, (shadow_position[0], shadow_position[1] - top), opaque=False
+                    )
+                    band = self._alpha_composite_at_position(
+                        band, source_img, (paste_position[0], paste_position[1] - top), opaque=source_opaque
+                    )
+                yield self._pil_to_pixbuf(band)
+        finally:
+            del source_img, shadow_img
+            self._account_full_resolution()
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._stage_cache.clear()
+            self._full_res_result = None
+        if self._loaded_image:
+            self._loaded_image.set_cache_bytes(0)
+
+    def _on_image_spilled(self, image: LoadedImage) -> None:
+        # Full resolution stages and results can hold the resident pixels, which keeps them in memory.
+        if image is self._loaded_image:
+            self._clear_stages("full")
+            with self._cache_lock:
+                self._full_res_result = None
+            image.set_cache_bytes(0)
+
+    def _account_full_resolution(self) -> None:
+        """
+        Count the full resolution stages and result against the resident image
+        budget. The stages are only kept for the next export when they fit.
+        """
+        image = self._loaded_image
+        result = self._full_res_result
+        result_bytes = result[1].get_byte_length() if result is not None else 0
+        image.set_cache_bytes(result_bytes + self._get_full_stage_bytes())
+        if not resident_images.has_room(0):
+            self._clear_stages("full")
+            image.set_cache_bytes(result_bytes)
+
+    def _get_full_stage_bytes(self) -> int:
+        with self._cache_lock:
+            values = [entry[1] for (resolution, _stage), entry in self._stage_cache.items() if resolution == "full"]
+        # Stages can pass the decoded source through unchanged, which the image already counts.
+        source = self._loaded_image.full_res_image if self._loaded_image.is_decoded else None
+        images = {}
+        for value in values:
+            stage_img = value[0] if isinstance(value, tuple) else value
+            if isinstance(stage_img, Image.Image) and stage_img is not source:
+                images[id(stage_img)] = stage_img
+        return sum(img.width * img.height * len(img.getbands()) for img in images.values())
+
+    def _clear_stages(self, resolution: str) -> None:
+        with self._cache_lock:
+            for entry in [entry for entry in self._stage_cache if entry[0] == resolution]:
+                del self._stage_cache[entry]
+
+    def is_identity(self) -> bool:
+        """
+        Whether rendering reproduces the loaded image pixel for pixel, so the
+        image itself can stand in for the render.
+        """
+        image = self._loaded_image
+        if not image or self.rotation or self.padding or self.corner_radius:
+            return False
+        if self.auto_balance and image.balanced_padding:
+            return False
+
+        width, height = image.full_res_size
+        if self._calculate_final_dimensions(width, height) != (width, height):
+            return False
+        # The background and shadow only show through translucent pixels.
+        return self._is_opaque(image.full_res_image)
+
+    def get_render_key(self) -> Hashable:
+        return (
+            id(self._loaded_image),
+            self.background.get_name() if self.background else None,
+            self.padding,
+            self.aspect_ratio,
+            self.corner_radius,
+            self.shadow_strength,
+            self.auto_balance,
+            self.rotation,
+        )
+
+    def _render(self, full_res: bool, cancellable: Optional[Gio.Cancellable] = None) -> Image.Image:
+        """
+        Run the render pipeline, reusing every stage whose inputs did not
+        change since the previous render at the same resolution.
+        """
+        resolution = "full" if full_res else "preview"
+        self.stage_timings = {}
+        source_img, paste_position, shadow_img, shadow_position, padded_size = self._render_layers(full_res, cancellable)
+        padded_width, padded_height = padded_size
+
+        background_key = (self.background.get_name() if self.background else None, padded_width, padded_height)
+        final_img = self._cached(
+            resolution, "background", background_key,
+            lambda: self._create_background_full_res(padded_width, padded_height) if full_res
+            else self._create_background(padded_width, padded_height),
+            cancellable
+        )
+        if cancellable:
+            cancellable.set_error_if_cancelled()
+
+        # The background is cached, so composite onto a copy of it.
+        start = time.perf_counter()
+        with span("composite", resolution=resolution):
+            final_img = final_img.copy()
+            final_img = self._alpha_composite_at_position(final_img, shadow_img, shadow_position, opaque=False)
+            final_img = self._alpha_composite_at_position(final_img, source_img, paste_position)
+        self.stage_timings["composite"] = time.perf_counter() - start
 
         return final_img
 
-    def process(self) -> tuple[GdkPixbuf.Pixbuf, int, int]:
-        final_img = self.process_to_pillow()
-        final_pixbuf = self._pil_to_pixbuf(final_img)
-        full_width, full_height = self.get_full_resolution_dimensions(final_pixbuf)
-        return final_pixbuf, full_width, full_height
+    def _render_layers(
+        self, full_res: bool, cancellable: Optional[Gio.Cancellable] = None
+    ) -> tuple[Image.Image, tuple[int, int], Image.Image, tuple[int, int], tuple[int, int]]:
+        """
+        Render the source and its shadow and lay them out on the padded canvas.
 
-    def process_full_resolution(self) -> GdkPixbuf.Pixbuf:
-        if not self._loaded_image or not self._loaded_image.full_res_image:
-            raise ValueError("No full resolution image loaded to process")
+        Returns the source, its position, the shadow, its position and the
+        size of the canvas.
+        """
+        resolution = "full" if full_res else "preview"
 
-        source_img = self._loaded_image.full_res_image.copy()
+        oriented_key = (self.rotation, self.auto_balance, min(self.padding, 0))
+        source_key = (oriented_key, self.corner_radius)
+
+        oriented_img = self._cached(
+            resolution, "oriented", oriented_key, lambda: self._orient_source(full_res), cancellable
+        )
+        source_img = self._cached(
+            resolution, "source", source_key, lambda: self._round_source(oriented_img), cancellable
+        )
+        width, height = source_img.size
+
+        padded_width, padded_height = self._calculate_final_dimensions(width, height)
+        paste_position = self._get_paste_position(width, height, padded_width, padded_height)
+
+        shadow_key = (source_key, self.shadow_strength)
+        shadow_img, shadow_offset = self._cached(
+            resolution, "shadow", shadow_key,
+            lambda: self._create_shadow_full_res(
+                source_img, offset=(10, 10), shadow_strength=self.shadow_strength, opaque=self._is_opaque(oriented_img)
+            ) if full_res
+            else self._create_shadow(
+                source_img, offset=(10, 10), shadow_strength=self.shadow_strength, opaque=self._is_opaque(oriented_img)
+            ),
+            cancellable
+        )
+        shadow_position = (paste_position[0] - shadow_offset[0], paste_position[1] - shadow_offset[1])
+
+        return source_img, paste_position, shadow_img, shadow_position, (padded_width, padded_height)
+
+    def _orient_source(self, full_res: bool) -> Image.Image:
+        if full_res:
+            source_img = self._loaded_image.full_res_image
+        else:
+            source_img = self._loaded_image.preview_image
 
         if self.rotation != 0:
             source_img = self._apply_rotation(source_img)
 
-        width, height = source_img.size
-
         if self.auto_balance and self._loaded_image.balanced_padding:
-            source_img = self._apply_auto_balance_full_res(source_img, self._loaded_image.balanced_padding)
-            width, height = source_img.size
+            if full_res:
+                source_img = self._apply_auto_balance_full_res(source_img, self._loaded_image.balanced_padding)
+            else:
+                source_img = self._apply_auto_balance(source_img, self._loaded_image.balanced_padding)
 
         if self.padding < 0:
             source_img = self._crop_image(source_img)
-            width, height = source_img.size
-
-        if self.corner_radius > 0:
-            source_img = self._apply_rounded_corners(source_img)
 
-        padded_width, padded_height = self._calculate_final_dimensions(width, height)
-        final_img = self._create_background_full_res(padded_width, padded_height)
-        paste_position = self._get_paste_position(width, height, padded_width, padded_height)
+        return source_img
 
-        shadow_img, shadow_offset = self._create_shadow_full_res(source_img, offset=(10, 10), shadow_strength=self.shadow_strength)
-        shadow_position = (paste_position[0] - shadow_offset[0], paste_position[1] - shadow_offset[1])
-        final_img = self._alpha_composite_at_position(final_img, shadow_img, shadow_position)
-
-        final_img = self._alpha_composite_at_position(final_img, source_img, paste_position)
+    def _round_source(self, image: Image.Image) -> Image.Image:
+        if self.corner_radius > 0:
+            return self._apply_rounded_corners(image)
+        return image
 
-        return self._pil_to_pixbuf(final_img)
+    def _is_opaque(self, image: Image.Image) -> bool:
+        """Whether the image is a fully opaque rectangle, so its shadow has a closed form."""
+        return image.mode == "RGBA" and image.getextrema()[3] == (255, 255)
 
+    def _cached(
+        self,
+        resolution: str,
+        stage: str,
+        key: Hashable,
+        compute: Callable[[], Any],
+        cancellable: Optional[Gio.Cancellable] = None
+    ) -> Any:
+        with self._cache_lock:
+            entry = self._stage_cache.get((resolution, stage))
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        if cancellable:
+            cancellable.set_error_if_cancelled()
+
+        start = time.perf_counter()
+        with span(stage, resolution=resolution):
+            value = compute()
+        # Only stages that actually ran are timed; cache hits cost nothing.
+        self.stage_timings[stage] = time.perf_counter() - start
+        with self._cache_lock:
+            self._stage_cache[(resolution, stage)] = (key, value)
+        return value
+
+    @traced("rotate")
     def _apply_rotation(self, image: Image.Image) -> Image.Image:
         if self.rotation == 0:
             return image
@@ -151,11 +448,11 @@ class ImageProcessor:
         return balanced_image
 
     def _apply_auto_balance_full_res(self, image: Image.Image, balanced_padding: BalancedPadding) -> Image.Image:
-        if not self._loaded_image or not self._loaded_image.preview_image or not self._loaded_image.full_res_image:
+        if not self._loaded_image or not self._loaded_image.preview_image or not self._loaded_image.full_res_size:
             return image
 
-        scale_x = self._loaded_image.full_res_image.width / self._loaded_image.preview_image.width
-        scale_y = self._loaded_image.full_res_image.height / self._loaded_image.preview_image.height
+        scale_x = self._loaded_image.full_res_size[0] / self._loaded_image.preview_image.width
+        scale_y = self._loaded_image.full_res_size[1] / self._loaded_image.preview_image.height
         scale = max(scale_x, scale_y)
 
         width, height = image.size
@@ -180,41 +477,45 @@ class ImageProcessor:
             return self.background.prepare_image(width, height)
         return Image.new("RGBA", (width, height), (0, 0, 0, 0))
 
+    def _create_background_region(self, width: int, height: int, box: tuple[int, int, int, int]) -> Image.Image:
+        left, top, right, bottom = box
+        # A background left behind by an earlier full render only needs cropping.
+        background_key = (self.background.get_name() if self.background else None, width, height)
+        with self._cache_lock:
+            entry = self._stage_cache.get(("full", "background"))
+        if entry is not None and entry[0] == background_key:
+            return entry[1].crop(box)
+
+        band = self._create_background_band(width, height, top, bottom)
+        if left == 0 and right == width:
+            return band
+        return band.crop((left, 0, right, bottom - top))
+
+    def _create_background_band(self, width: int, height: int, top: int, bottom: int) -> Image.Image:
+        band = self.background.prepare_band(width, height, top, bottom) if self.background else None
+        if band is None:
+            return Image.new("RGBA", (width, bottom - top), (0, 0, 0, 0))
+        return band
+
     def _create_shadow_full_res(
         self,
         image: Image.Image,
         offset: tuple[int, int] = (10, 10),
-        shadow_strength: float = 1.0
+        shadow_strength: float = 1.0,
+        opaque: bool = False
     ) -> tuple[Image.Image, tuple[int, int]]:
-        if not self._loaded_image or not self._loaded_image.preview_image or not self._loaded_image.full_res_image:
+        if not self._loaded_image or not self._loaded_image.preview_image or not self._loaded_image.full_res_size:
             scale = 1.0
         else:
-            scale_x = self._loaded_image.full_res_image.width / self._loaded_image.preview_image.width
-            scale_y = self._loaded_image.full_res_image.height / self._loaded_image.preview_image.height
+            scale_x = self._loaded_image.full_res_size[0] / self._loaded_image.preview_image.width
+            scale_y = self._loaded_image.full_res_size[1] / self._loaded_image.preview_image.height
             scale = max(scale_x, scale_y)
 
         shadow_strength = max(0.0, min(shadow_strength, 10)) / 5
         blur_radius = int(10 * shadow_strength * scale)
-        shadow_alpha = int(150 * shadow_strength)
-        shadow_color = (0, 0, 0, shadow_alpha)
         scaled_offset = (int(offset[0] * scale), int(offset[1] * scale))
 
-        alpha = image.split()[3]
-        shadow = Image.new("RGBA", image.size, shadow_color)
-        shadow.putalpha(alpha)
-
-        extra_margin = blur_radius * 5
-        expanded_width = image.width + abs(scaled_offset[0]) + extra_margin
-        expanded_height = image.height + abs(scaled_offset[1]) + extra_margin
-        shadow_canvas = Image.new("RGBA", (expanded_width, expanded_height), (0, 0, 0, 0))
-
-        shadow_x = extra_margin // 2 + max(scaled_offset[0], 0)
-        shadow_y = extra_margin // 2 + max(scaled_offset[1], 0)
-        shadow_canvas.paste(shadow, (shadow_x, shadow_y), shadow)
-
-        shadow_canvas = shadow_canvas.filter(ImageFilter.GaussianBlur(blur_radius))
-
-        return shadow_canvas, (shadow_x, shadow_y)
+        return self._create_shadow_with_radius(image, blur_radius, scaled_offset, opaque)
 
     def _get_percentage(self, value: float) -> float:
         return value / 100.0
@@ -223,19 +524,45 @@ class ImageProcessor:
         self,
         background: Image.Image,
         foreground: Image.Image,
-        position: tuple[int, int]
+        position: tuple[int, int],
+        opaque: Optional[bool] = None
     ) -> Image.Image:
+        """
+        Composite the foreground onto the background in place and return it.
+
+        Only the region covered by the foreground is touched. The foreground
+        is first masked by its own alpha, the same as pasting it with itself
+        as mask onto a transparent layer. Opaque foregrounds are copied as is;
+        pass `opaque` when it is already known to skip checking.
+        """
         if background.mode != 'RGBA':
             background = background.convert('RGBA')
 
         if foreground.mode != 'RGBA':
             foreground = foreground.convert('RGBA')
 
-        temp_canvas = Image.new('RGBA', background.size, (0, 0, 0, 0))
-        temp_canvas.paste(foreground, position, foreground)
-        result = Image.alpha_composite(background, temp_canvas)
-
-        return result
+        x, y = position
+        left = max(0, -x)
+        top = max(0, -y)
+        right = min(foreground.width, background.width - x)
+        bottom = min(foreground.height, background.height - y)
+        if left >= right or top >= bottom:
+            return background
+
+        if opaque is None:
+            covered = foreground
+            if (left, top, right, bottom) != (0, 0, foreground.width, foreground.height):
+                covered = foreground.crop((left, top, right, bottom))
+            opaque = covered.getextrema()[3][0] == 255
+
+        if opaque:
+            background.paste(foreground, position)
+            return background
+
+        layer = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+        layer.paste(foreground, (-left, -top), foreground)
+        background.alpha_composite(layer, dest=(x + left, y + top))
+        return background
 
     def _crop_image(self, image: Image.Image) -> Image.Image:
         width, height = image.size
@@ -253,11 +580,11 @@ class ImageProcessor:
         )
 
     def get_full_resolution_dimensions(self, processed_pixbuf) -> tuple[int, int]:
-        if not self._loaded_image or not self._loaded_image.full_res_image or not self._loaded_image.preview_image:
+        if not self._loaded_image or not self._loaded_image.full_res_size or not self._loaded_image.preview_image:
             raise ValueError("No images loaded")
 
-        scale_x = self._loaded_image.full_res_image.width / self._loaded_image.preview_image.width
-        scale_y = self._loaded_image.full_res_image.height / self._loaded_image.preview_image.height
+        scale_x = self._loaded_image.full_res_size[0] / self._loaded_image.preview_image.width
+        scale_y = self._loaded_image.full_res_size[1] / self._loaded_image.preview_image.height
         scale = max(scale_x, scale_y)
 
         downscaled_width = processed_pixbuf.get_width()
@@ -308,27 +635,14 @@ class ImageProcessor:
 
         raise ValueError("aspect_ratio is None and cannot be converted to float")
 
-    def _apply_rounded_corners(self, image: Image.Image) -> Image.Image:
-        width, height = image.size
+    def _get_corner_radius_pixels(self, width: int, height: int) -> int:
         smaller_dimension = min(width, height)
         radius_percentage = self._get_percentage(self.corner_radius)
-        radius_pixels = int(radius_percentage * smaller_dimension)
-        oversample = 4
+        return int(radius_percentage * smaller_dimension)
 
-        large_mask = Image.new("L", (width * oversample, height * oversample), 0)
-
-        draw = ImageDraw.Draw(large_mask)
-        draw.rounded_rectangle(
-            (0, 0, width * oversample, height * oversample),
-            radius=radius_pixels * oversample,
-            fill=255
-        )
-
-        mask = large_mask.resize((width, height), Image.LANCZOS)
-        r, g, b, alpha = image.split()
-        new_alpha = ImageChops.multiply(alpha, mask)
-
-        return Image.merge("RGBA", (r, g, b, new_alpha))
+    @traced("round-corners")
+    def _apply_rounded_corners(self, image: Image.Image) -> Image.Image:
+        return round_corners(image, self._get_corner_radius_pixels(*image.size))
 
     def _create_background(self, width: int, height: int) -> Image.Image:
         if self.background:
@@ -339,29 +653,25 @@ class ImageProcessor:
         self,
         image: Image.Image,
         offset: tuple[int, int] = (10, 10),
-        shadow_strength: float = 1.0
+        shadow_strength: float = 1.0,
+        opaque: bool = False
     ) -> tuple[Image.Image, tuple[int, int]]:
         shadow_strength = max(0.0, min(shadow_strength, 10)) / 5
         blur_radius = int(10 * shadow_strength)
-        shadow_alpha = int(150 * shadow_strength)
-        shadow_color = (0, 0, 0, shadow_alpha)
-
-        alpha = image.split()[3]
-        shadow = Image.new("RGBA", image.size, shadow_color)
-        shadow.putalpha(alpha)
-
-        extra_margin = blur_radius * 5
-        expanded_width = image.width + abs(offset[0]) + extra_margin
-        expanded_height = image.height + abs(offset[1]) + extra_margin
-        shadow_canvas = Image.new("RGBA", (expanded_width, expanded_height), (0, 0, 0, 0))
 
-        shadow_x = extra_margin // 2 + max(offset[0], 0)
-        shadow_y = extra_margin // 2 + max(offset[1], 0)
-        shadow_canvas.paste(shadow, (shadow_x, shadow_y), shadow)
+        return self._create_shadow_with_radius(image, blur_radius, offset, opaque)
 
-        shadow_canvas = shadow_canvas.filter(ImageFilter.GaussianBlur(blur_radius))
-
-        return shadow_canvas, (shadow_x, shadow_y)
+    def _create_shadow_with_radius(
+        self,
+        image: Image.Image,
+        blur_radius: int,
+        offset: tuple[int, int],
+        opaque: bool
+    ) -> tuple[Image.Image, tuple[int, int]]:
+        if opaque and blur_radius > 0:
+            corner_radius = self._get_corner_radius_pixels(*image.size) if self.corner_radius > 0 else 0
+            return create_rounded_rect_shadow(image.size, corner_radius, blur_radius, offset)
+        return create_drop_shadow(image, blur_radius, offset)
 
     def _get_paste_position(
         self,
@@ -376,22 +686,39 @@ class ImageProcessor:
             return x, y
         return 0, 0
 
+    @traced("pil-to-pixbuf")
     def _pil_to_pixbuf(self, image: Image.Image) -> GdkPixbuf.Pixbuf:
+        """
+        Wrap the rendered pixels in a pixbuf backed by a single GLib.Bytes.
+
+        The pixbuf shares that buffer instead of owning a copy, so textures
+        made from it with `read_pixel_bytes()` reuse the same memory.
+        """
         if image.mode != 'RGBA':
             image = image.convert('RGBA')
 
         width, height = image.size
-        pixels = image.tobytes()
-
-        pixbuf = GdkPixbuf.Pixbuf.new_from_data(
-            data=pixels,
-            colorspace=GdkPixbuf.Colorspace.RGB,
-            has_alpha=True,
-            bits_per_sample=8,
-            width=width,
-            height=height,
-            rowstride=width * 4,
-            destroy_fn=None
+        pixels = GLib.Bytes.new(self._get_pixel_bytes(image))
+
+        return GdkPixbuf.Pixbuf.new_from_bytes(
+            pixels,
+            GdkPixbuf.Colorspace.RGB,
+            True,
+            8,
+            width,
+            height,
+            width * 4
         )
 
-        return pixbuf
+    def _get_pixel_bytes(self, image: Image.Image) -> bytes:
+        # Image.tobytes() encodes in small chunks and joins them, which copies
+        # the pixels twice. Encoding into one buffer of the full size copies once.
+        if image.width == 0 or image.height == 0:
+            return b""
+        image.load()
+        encoder = Image._getencoder(image.mode, "raw", image.mode)
+        encoder.setimage(image.im, (0, 0) + image.size)
+        _consumed, status, data = encoder.encode(image.width * image.height * len(image.getbands()))
+        if status != 1:
+            return image.tobytes()
+        return data
@@ -17,15 +17,25 @@
 
 import os
 import math
-from PIL import Image
-from typing import Optional
+import mmap
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from PIL import Image, ImageChops
+from typing import Callable, Optional
 from gradia.backend.logger import Logger
+from gradia.backend.tracing import span, traced
+from gradia.graphics.preview_cache import PreviewCache
 from dataclasses import dataclass
 from enum import Enum, auto
 ImportFormat = tuple[str, str]
 
 logger = Logger()
 
+# Rows copied at a time when spilling, to bound the extra memory it takes.
+SPILL_BAND_ROWS = 256
+
 class ImageOrigin(Enum):
     FileDialog = auto()
     DragDrop = auto()
@@ -55,18 +65,97 @@ class BalancedPadding:
     def total_vertical(self) -> int:
         return self.top + self.bottom
 
+class ResidentImagePool:
+    """
+    Keeps the decoded full resolution images of all windows within a memory budget.
+
+    Images are tracked from least to most recently used. When they need more
+    than `budget_bytes` together, the least recently used ones are spilled to
+    memory-mapped files, which the kernel pages out and back in as needed.
+    Spilling only frees memory once every copy of the old image is gone, so
+    spilled images notify their `connect_spilled` callbacks.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None) -> None:
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._resident: OrderedDict[int, weakref.ref] = OrderedDict()
+
+    def touch(self, image: 'LoadedImage') -> None:
+        """Mark `image` as most recently used and spill others if over budget."""
+        key = id(image)
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+            else:
+                self._resident[key] = weakref.ref(image, lambda _ref: self._resident.pop(key, None))
+            victims = self._take_victims(image)
+
+        for victim in victims:
+            victim._spill()
+
+    def has_room(self, extra_bytes: int) -> bool:
+        """Whether `extra_bytes` more fit in the budget without spilling anything."""
+        if self.budget_bytes is None:
+            return True
+        with self._lock:
+            images = [ref() for ref in self._resident.values()]
+            total = sum(image.resident_bytes for image in images if image is not None)
+        return total + extra_bytes <= self.budget_bytes
+
+    def _take_victims(self, current: 'LoadedImage') -> list['LoadedImage']:
+        if self.budget_bytes is None:
+            return []
+
+        images = [ref() for ref in self._resident.values()]
+        images = [image for image in images if image is not None]
+        excess = sum(image.resident_bytes for image in images) - self.budget_bytes
+
+        victims = []
+        for image in images:
+            if excess <= 0:
+                break
+            if image is current:
+                continue
+            victims.append(image)
+            excess -= image.resident_bytes
+            self._resident.pop(id(image), None)
+        return victims
+
+
+resident_images = ResidentImagePool()
+
+
 class LoadedImage:
     MAX_PIXEL_AMOUNT = 1024 * 1024
 
-    def __init__(self, image_path: str, origin: ImageOrigin, screenshot_path: str = None):
+    def __init__(
+        self,
+        image_path: str,
+        origin: ImageOrigin,
+        screenshot_path: str = None,
+        spill_dir: Optional[str] = None,
+        preview_cache: Optional[PreviewCache] = None
+    ):
         self.image_path: str = image_path
         self.origin: ImageOrigin = origin
         self.screenshot_path: str | None = screenshot_path
+        self.spill_dir: Optional[str] = spill_dir
+        self._preview_cache: Optional[PreviewCache] = preview_cache
+        self._cache_key: Optional[str] = None
 
         self._full_res_img: Optional[Image.Image] = None
+        self._full_res_size: Optional[tuple[int, int]] = None
+        self._full_res_lock = threading.Lock()
+        self._spill_map: Optional[mmap.mmap] = None
         self._preview_img: Optional[Image.Image] = None
         self._balanced_padding: Optional[BalancedPadding] = None
+        self._padding_analyzed: bool = False
+        self._padding_lock = threading.Lock()
         self._load_error: Optional[str] = None
+        self._file_format: Optional[str] = None
+        self._spilled_callbacks: list[weakref.WeakMethod] = []
+        self._cache_bytes = 0
 
         self._load_and_analyze_image()
 
@@ -76,73 +165,166 @@ class LoadedImage:
                 self._load_error = f"Image file not found: {self.image_path}"
                 return
 
-            self._full_res_img = Image.open(self.image_path).convert("RGBA")
-            self._preview_img = self._create_preview_image(self._full_res_img)
-            self._balanced_padding = self._analyze_padding(self._preview_img)
+            if self._load_cached_preview():
+                return
+
+            with span("decode-preview", path=self.image_path), Image.open(self.image_path) as source:
+                self._full_res_size = source.size
+                self._file_format = source.format
+                if self._needs_downscaling(source):
+                    self._preview_img = self._decode_preview(source)
+                    self._store_cached_preview()
+                else:
+                    self._full_res_img = source.convert("RGBA")
+                    self._preview_img = self._full_res_img.copy()
+
+            if self._full_res_img is not None and self.spill_dir:
+                resident_images.touch(self)
 
         except Exception as e:
             self._load_error = f"Error loading image: {str(e)}"
 
-    def _create_preview_image(self, image: Image.Image) -> Image.Image:
-        if self._needs_downscaling(image):
-            return self._downscale_image(image)
-        return image.copy()
+    def _load_cached_preview(self) -> bool:
+        if self._preview_cache is None:
+            return False
+
+        with span("load-cached-preview", path=self.image_path):
+            cached = self._preview_cache.load(self.image_path)
+        if cached is None:
+            return False
+
+        self._cache_key = cached.key
+        self._preview_img = cached.image
+        self._full_res_size = cached.full_size
+        if cached.padding is not None:
+            top, bottom, left, right, color = cached.padding
+            self._balanced_padding = BalancedPadding(top, bottom, left, right, color)
+            self._padding_analyzed = True
+        return True
+
+    def _store_cached_preview(self) -> None:
+        # Only downscaled previews are cached; small images decode quickly anyway.
+        if self._preview_cache is None:
+            return
+
+        self._cache_key = self._preview_cache.get_key(self.image_path)
+        if self._cache_key is not None:
+            self._preview_cache.store(self._cache_key, self._preview_img, self._full_res_size)
+
+    def _decode_preview(self, source: Image.Image) -> Image.Image:
+        """
+        Decode a downscaled preview without decoding the full image at full size.
+
+        JPEG is scaled down by the decoder itself. Other formats are reduced
+        by an integer factor before the final resampling.
+        """
+        width, height = self._get_preview_size(*source.size)
+
+        if source.format == "JPEG":
+            source.draft("RGB", (width, height))
+
+        if source.mode not in ("RGB", "RGBA", "L"):
+            source = source.convert("RGBA")
+
+        preview = source.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        return preview.convert("RGBA")
+
+    def _decode_full_res(self) -> Optional[Image.Image]:
+        try:
+            with span("decode", path=self.image_path), Image.open(self.image_path) as source:
+                return source.convert("RGBA")
+        except Exception as e:
+            logger.error(f"Error decoding full resolution image: {e}")
+            return None
+
+    def _spill(self) -> None:
+        """
+        Move the full resolution pixels to a memory-mapped file in `spill_dir`.
+
+        The image is replaced by one that reads straight from the mapping, so
+        it stays usable without a copy while its pages can be reclaimed.
+        """
+        with self._full_res_lock:
+            image = self._full_res_img
+            if image is None or not self.spill_dir:
+                return
+
+            # Already spilled images can still be picked for the renders counted in `_cache_bytes`.
+            if self._spill_map is None:
+                try:
+                    with span("spill", path=self.image_path):
+                        spill_map = self._write_spill_file(image)
+                except OSError as e:
+                    logger.warning(f"Could not spill full resolution image to disk: {e}")
+                    return
+
+                self._spill_map = spill_map
+                self._full_res_img = Image.frombuffer("RGBA", image.size, spill_map, "raw", "RGBA", 0, 1)
+
+        for ref in list(self._spilled_callbacks):
+            callback = ref()
+            if callback is None:
+                self._spilled_callbacks.remove(ref)
+            else:
+                callback(self)
+
+    def connect_spilled(self, callback: Callable[['LoadedImage'], None]) -> None:
+        """
+        Call the bound method `callback` after the pixels were spilled, so
+        caches can drop what still references the resident image. Only a
+        weak reference to it is kept.
+        """
+        self._spilled_callbacks.append(weakref.WeakMethod(callback))
+
+    def _write_spill_file(self, image: Image.Image) -> mmap.mmap:
+        width, height = image.size
+        fd, path = tempfile.mkstemp(prefix="full-res-", suffix=".rgba", dir=self.spill_dir)
+        try:
+            with os.fdopen(fd, "w+b") as spill_file:
+                for top in range(0, height, SPILL_BAND_ROWS):
+                    band = image.crop((0, top, width, min(height, top + SPILL_BAND_ROWS)))
+                    spill_file.write(band.tobytes())
+                spill_file.flush()
+                return mmap.mmap(spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            # The mapping keeps the data alive, and nothing is left behind on exit.
+            os.unlink(path)
 
     def _needs_downscaling(self, image: Image.Image) -> bool:
         width, height = image.size
         return (width * height) > self.MAX_PIXEL_AMOUNT
 
-    def _downscale_image(self, image: Image.Image) -> Image.Image:
-        width, height = image.size
+    def _get_preview_size(self, width: int, height: int) -> tuple[int, int]:
         current_pixel_count = width * height
         if current_pixel_count <= self.MAX_PIXEL_AMOUNT:
-            return image
+            return width, height
         scale_factor = math.sqrt(self.MAX_PIXEL_AMOUNT / current_pixel_count)
         new_width = max(1, int(width * scale_factor))
         new_height = max(1, int(height * scale_factor))
-        return image.resize((new_width, new_height), Image.LANCZOS)
+        return new_width, new_height
 
+    @traced("analyze-padding")
     def _analyze_padding(self, image: Image.Image, tolerance: int = 5) -> Optional[BalancedPadding]:
         if not image:
             return None
 
         img = image.convert("RGBA")
-        pixels = img.load()
         width, height = img.size
+        ref_color = img.getpixel((0, 0))
 
-        ref_color = pixels[0, 0]
-
-        def is_similar(px):
-            return all(abs(px[i] - ref_color[i]) <= tolerance for i in range(4))
-
-        def count_top():
-            for y in range(height):
-                if any(not is_similar(pixels[x, y]) for x in range(width)):
-                    return y
-            return height
+        difference = ImageChops.difference(img, Image.new("RGBA", img.size, ref_color))
+        red, green, blue, alpha = difference.split()
+        largest = ImageChops.lighter(ImageChops.lighter(red, green), ImageChops.lighter(blue, alpha))
+        content_mask = largest.point(lambda value: 255 if value > tolerance else 0)
 
-        def count_bottom():
-            for y in reversed(range(height)):
-                if any(not is_similar(pixels[x, y]) for x in range(width)):
-                    return height - 1 - y
-            return height
-
-        def count_left():
-            for x in range(width):
-                if any(not is_similar(pixels[x, y]) for y in range(height)):
-                    return x
-            return width
-
-        def count_right():
-            for x in reversed(range(width)):
-                if any(not is_similar(pixels[x, y]) for y in range(height)):
-                    return width - 1 - x
-            return width
-
-        top = count_top()
-        bottom = count_bottom()
-        left = count_left()
-        right = count_right()
+        bbox = content_mask.getbbox()
+        if bbox is None:
+            top = bottom = height
+            left = right = width
+        else:
+            left, top, content_right, content_bottom = bbox
+            right = width - content_right
+            bottom = height - content_bottom
 
         max_padding = max(top, bottom, left, right)
 
@@ -158,7 +340,57 @@ class LoadedImage:
 
     @property
     def full_res_image(self) -> Optional[Image.Image]:
-        return self._full_res_img
+        # Only exports and OCR need every pixel, so decode on first use.
+        with self._full_res_lock:
+            if self._full_res_img is None and self._preview_img is not None:
+                self._full_res_img = self._decode_full_res()
+            image = self._full_res_img
+            resident = self._spill_map is None
+
+        if image is not None and resident and self.spill_dir:
+            resident_images.touch(self)
+        return image
+
+    @property
+    def full_res_size(self) -> Optional[tuple[int, int]]:
+        return self._full_res_size
+
+    @property
+    def file_format(self) -> Optional[str]:
+        """The Pillow format name of the file on disk, such as "PNG", read from its header."""
+        if self._file_format is None:
+            try:
+                with Image.open(self.image_path) as source:
+                    self._file_format = source.format
+            except Exception as e:
+                logger.warning(f"Could not identify image format: {e}")
+        return self._file_format
+
+    @property
+    def resident_bytes(self) -> int:
+        """Memory taken by the full resolution pixels, excluding spilled ones, and by renders of them."""
+        image = self._full_res_img
+        if image is None or self._spill_map is not None:
+            return self._cache_bytes
+        return image.width * image.height * 4 + self._cache_bytes
+
+    @property
+    def is_decoded(self) -> bool:
+        return self._full_res_img is not None
+
+    def set_cache_bytes(self, cache_bytes: int) -> None:
+        """
+        Count `cache_bytes` of renders derived from this image against the
+        resident budget. Spilling the image invites them to be dropped.
+        """
+        grew = cache_bytes > self._cache_bytes
+        self._cache_bytes = cache_bytes
+        if grew and self.spill_dir:
+            resident_images.touch(self)
+
+    @property
+    def is_spilled(self) -> bool:
+        return self._spill_map is not None
 
     @property
     def preview_image(self) -> Optional[Image.Image]:
@@ -166,6 +398,17 @@ class LoadedImage:
 
     @property
     def balanced_padding(self) -> Optional[BalancedPadding]:
+        # Only needed when auto balance is enabled, so analyze on first use.
+        with self._padding_lock:
+            if not self._padding_analyzed and self._preview_img is not None:
+                self._balanced_padding = self._analyze_padding(self._preview_img)
+                self._padding_analyzed = True
+                if self._cache_key is not None and self._balanced_padding is not None:
+                    padding = self._balanced_padding
+                    self._preview_cache.store_padding(
+                        self._cache_key,
+                        (padding.top, padding.bottom, padding.left, padding.right, padding.color)
+                    )
         return self._balanced_padding
 
     @property
@@ -174,7 +417,7 @@ class LoadedImage:
 
     @property
     def is_loaded(self) -> bool:
-        return self._load_error is None and self._full_res_img is not None
+        return self._load_error is None and self._preview_img is not None
 
     def get_proper_name(self, with_extension: bool = True) -> str:
         if self.origin == ImageOrigin.Clipboard:
@@ -0,0 +1,59 @@
+# Copyright (C) 2025 Alexander Vanhee
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import io
+
+from PIL import Image, features
+
+PALETTE_COLORS = 256
+
+
+def quantize_image(image: Image.Image, colors: int = PALETTE_COLORS, dither: bool = True) -> Image.Image:
+    """
+    Reduce `image` to a palette of at most `colors` colors.
+
+    Opaque images are reduced with median cut, which keeps images that
+    already use few enough colors exact, and are then dithered against that
+    palette when colors were lost. Translucent images go through
+    libimagequant when Pillow has it and an octree otherwise, the only
+    built-in method that keeps alpha, and are not dithered.
+    """
+    if image.mode == "RGBA" and image.getchannel("A").getextrema()[0] == 255:
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+
+    if image.mode == "RGBA":
+        method = Image.Quantize.LIBIMAGEQUANT if features.check("libimagequant") else Image.Quantize.FASTOCTREE
+        return image.quantize(colors, method=method)
+
+    quantized = image.quantize(colors, method=Image.Quantize.MEDIANCUT)
+    if dither and image.getcolors(colors) is None:
+        quantized = image.quantize(palette=quantized, dither=Image.Dither.FLOYDSTEINBERG)
+    return quantized
+
+
+def encode_palette_png(
+    image: Image.Image,
+    compress_level: int = 6,
+    colors: int = PALETTE_COLORS,
+    dither: bool = True
+) -> bytes:
+    """Quantize `image` and encode it as an indexed PNG."""
+    buffer = io.BytesIO()
+    quantize_image(image, colors, dither).save(buffer, "PNG", compress_level=compress_level)
+    return buffer.getvalue()
@@ -0,0 +1,177 @@
+# Copyright (C) 2025 Alexander Vanhee
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import struct
+import zlib
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+from PIL import Image, ImageChops
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IDAT_CHUNK_SIZE = 1 << 18
+FILTER_UP = 2
+
+# Compression levels by preset name, as offered in the preferences.
+PNG_PRESETS = {
+    "fast": 1,
+    "balanced": 6,
+    "small": 9,
+}
+DEFAULT_PNG_PRESET = "balanced"
+
+# Filtered bytes deflated per block when compressing on several threads.
+# Blocks have a fixed size so the file does not depend on the thread count.
+DEFLATE_BLOCK_SIZE = 1 << 20
+DEFLATE_WINDOW = 1 << 15
+
+
+class PngWriter:
+    """
+    Encodes a PNG incrementally from bands of rows.
+
+    Rows are filtered and compressed as they arrive, so only the current
+    band has to be in memory. The output depends only on the pixels and the
+    compression level, never on how the rows were split into bands.
+
+    With `threads` above one the deflate stream is cut into fixed size
+    blocks that are compressed in parallel, each primed with the end of
+    the previous block and ended with a sync flush, as pigz does. The
+    result is a standard zlib stream that decodes to the same pixels.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[bytes], Any],
+        width: int,
+        height: int,
+        has_alpha: bool = True,
+        compress_level: int = 6,
+        threads: int = 1
+    ) -> None:
+        if width <= 0 or height <= 0:
+            raise ValueError("Image dimensions must be positive")
+
+        self._write = write
+        self.width = width
+        self.height = height
+        self._mode = "RGBA" if has_alpha else "RGB"
+        self._row_bytes = width * len(self._mode)
+        self._rows_written = 0
+        self._previous_row = bytes(self._row_bytes)
+        self._compress_level = compress_level
+        self._pending = bytearray()
+
+        self._threads = max(1, threads)
+        if self._threads == 1:
+            self._compressor = zlib.compressobj(compress_level)
+        else:
+            self._pool = ThreadPoolExecutor(self._threads, thread_name_prefix="png-deflate")
+            self._blocks: deque[Future] = deque()
+            self._block = bytearray()
+            self._dictionary = b""
+            self._adler = zlib.adler32(b"")
+            self._pending += b"\x78\x9c"
+
+        color_type = 6 if has_alpha else 2
+        self._write(PNG_SIGNATURE)
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+
+    def write_rows(self, data: bytes, rowstride: int, rows: int) -> None:
+        """Append `rows` rows of 8-bit RGB(A) pixels, each `rowstride` bytes apart in `data`."""
+        if self._rows_written + rows > self.height:
+            raise ValueError("More rows written than the image height")
+        if rows <= 0:
+            return
+
+        row_bytes = self._row_bytes
+        if rowstride == row_bytes:
+            packed = bytes(data[:row_bytes * rows])
+        else:
+            packed = b"".join(data[i * rowstride:i * rowstride + row_bytes] for i in range(rows))
+
+        # The Up filter subtracts the row above, which is the image shifted down by a row.
+        size = (self.width, rows)
+        current = Image.frombytes(self._mode, size, packed)
+        above = Image.frombytes(self._mode, size, self._previous_row + packed[:-row_bytes])
+        filtered = ImageChops.subtract_modulo(current, above).tobytes()
+        self._previous_row = packed[-row_bytes:]
+
+        prefix = bytes([FILTER_UP])
+        self._compress(b"".join(
+            prefix + filtered[i * row_bytes:(i + 1) * row_bytes] for i in range(rows)
+        ))
+        self._rows_written += rows
+
+    def close(self) -> None:
+        if self._rows_written != self.height:
+            raise ValueError(f"Expected {self.height} rows, got {self._rows_written}")
+
+        if self._threads == 1:
+            self._pending += self._compressor.flush()
+        else:
+            self._submit_block(bytes(self._block), last=True)
+            self._block = bytearray()
+            self._collect_blocks(keep=0)
+            self._pool.shutdown()
+            self._pending += struct.pack(">I", self._adler)
+        self._flush_idat(final=True)
+        self._write_chunk(b"IEND", b"")
+
+    def _compress(self, data: bytes) -> None:
+        if self._threads == 1:
+            self._pending += self._compressor.compress(data)
+        else:
+            self._block += data
+            while len(self._block) >= DEFLATE_BLOCK_SIZE:
+                block = bytes(self._block[:DEFLATE_BLOCK_SIZE])
+                del self._block[:DEFLATE_BLOCK_SIZE]
+                self._submit_block(block, last=False)
+            # Bound the memory held by blocks in flight.
+            self._collect_blocks(keep=self._threads * 2)
+        self._flush_idat(final=False)
+
+    def _submit_block(self, block: bytes, last: bool) -> None:
+        self._adler = zlib.adler32(block, self._adler)
+        self._blocks.append(self._pool.submit(_deflate_block, block, self._dictionary, self._compress_level, last))
+        self._dictionary = block[-DEFLATE_WINDOW:]
+
+    def _collect_blocks(self, keep: int) -> None:
+        while len(self._blocks) > keep:
+            self._pending += self._blocks.popleft().result()
+
+    def _flush_idat(self, final: bool) -> None:
+        # Chunks have a fixed size so the file does not depend on the band layout.
+        while len(self._pending) >= IDAT_CHUNK_SIZE or (final and self._pending):
+            chunk = bytes(self._pending[:IDAT_CHUNK_SIZE])
+            del self._pending[:IDAT_CHUNK_SIZE]
+            self._write_chunk(b"IDAT", chunk)
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self._write(struct.pack(">I", len(data)))
+        self._write(chunk_type + data)
+        self._write(struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+
+def _deflate_block(block: bytes, dictionary: bytes, compress_level: int, last: bool) -> bytes:
+    if dictionary:
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
@@ -0,0 +1,180 @@
+# Copyright (C) 2025 Alexander Vanhee
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+from gradia.backend.logger import Logger
+
+logger = Logger()
+
+CACHE_MAGIC = b"GRPV"
+CACHE_VERSION = 1
+# Magic, version, preview size, full size, whether the padding is known,
+# the padding (top, bottom, left, right) and its RGBA color.
+HEADER = struct.Struct("<4sHIIII?IIII4B")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+PaddingValues = tuple[int, int, int, int, tuple[int, int, int, int]]
+
+
+@dataclass(frozen=True)
+class CachedPreview:
+    key: str
+    image: Image.Image
+    full_size: tuple[int, int]
+    padding: Optional[PaddingValues]
+
+
+class PreviewCache:
+    """
+    On-disk cache of decoded previews and their padding analysis.
+
+    Entries are keyed by the file's path, size and modification time, and
+    hold the raw RGBA preview after a fixed size header, so a hit is a single
+    read. The least recently used entries are evicted once the directory
+    grows beyond `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        identity = f"{os.path.realpath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return hashlib.sha256(identity.encode("utf-8", "surrogateescape")).hexdigest()
+
+    def load(self, path: str) -> Optional[CachedPreview]:
+        key = self.get_key(path)
+        if key is None:
+            return None
+
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path, "rb") as entry:
+                data = entry.read()
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not read cached preview: {e}")
+            return None
+
+        try:
+            magic, version, width, height, full_width, full_height, has_padding, *padding = HEADER.unpack_from(data)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                return None
+            image = Image.frombytes("RGBA", (width, height), data[HEADER.size:])
+        except (struct.error, ValueError) as e:
+            logger.warning(f"Ignoring corrupt cached preview {entry_path}: {e}")
+            return None
+
+        padding_values = (*padding[:4], tuple(padding[4:])) if has_padding else None
+        return CachedPreview(key, image, (full_width, full_height), padding_values)
+
+    def store(
+        self,
+        key: str,
+        image: Image.Image,
+        full_size: tuple[int, int],
+        padding: Optional[PaddingValues] = None
+    ) -> None:
+        image = image.convert("RGBA")
+        header = self._pack_header(image.size, full_size, padding)
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=self.directory)
+            try:
+                with os.fdopen(fd, "wb") as entry:
+                    entry.write(header)
+                    entry.write(image.tobytes())
+                os.replace(temp_path, self._get_entry_path(key))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Could not cache preview: {e}")
+            return
+
+        self._evict()
+
+    def store_padding(self, key: str, padding: PaddingValues) -> None:
+        """Add the padding analysis to an existing entry, which only rewrites its header."""
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path, "r+b") as entry:
+                header = HEADER.unpack(entry.read(HEADER.size))
+                if header[0] != CACHE_MAGIC or header[1] != CACHE_VERSION:
+                    return
+                entry.seek(0)
+                entry.write(self._pack_header((header[2], header[3]), (header[4], header[5]), padding))
+        except FileNotFoundError:
+            return
+        except (OSError, struct.error) as e:
+            logger.warning(f"Could not cache padding analysis: {e}")
+
+    def _pack_header(
+        self,
+        size: tuple[int, int],
+        full_size: tuple[int, int],
+        padding: Optional[PaddingValues]
+    ) -> bytes:
+        top, bottom, left, right, color = padding or (0, 0, 0, 0, (0, 0, 0, 0))
+        return HEADER.pack(
+            CACHE_MAGIC, CACHE_VERSION, *size, *full_size,
+            padding is not None, top, bottom, left, right, *color
+        )
+
+    def _evict(self) -> None:
+        with self._lock:
+            try:
+                entries = []
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        if entry.name.endswith(".preview") and entry.is_file():
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            except OSError as e:
+                logger.warning(f"Could not scan preview cache: {e}")
+                return
+
+            total = sum(size for _mtime, size, _path in entries)
+            for _mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+
+    def _get_entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.preview")
@@ -0,0 +1,73 @@
+# Copyright (C) 2025 Alexander Vanhee
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from PIL import Image, ImageChops, ImageFilter
+
+# Blurring at a radius below this after downsampling starts to show the
+# bilinear upsampling, so larger radii are reduced down to about this size.
+MIN_REDUCED_RADIUS = 6
+
+
+def create_drop_shadow(
+    image: Image.Image,
+    blur_radius: int,
+    offset: tuple[int, int],
+    color: tuple[int, int, int] = (0, 0, 0)
+) -> tuple[Image.Image, tuple[int, int]]:
+    """
+    Create a blurred drop shadow for the alpha channel of an RGBA image.
+
+    Only the alpha channel is blurred, at a resolution reduced in proportion
+    to the blur radius, and the result is colorized afterwards.
+
+    Returns:
+        The shadow canvas and the position of the image within it.
+    """
+    alpha = image.getchannel("A")
+    # Matches pasting the shadow with its own alpha as mask.
+    alpha = ImageChops.multiply(alpha, alpha)
+
+    extra_margin = blur_radius * 5
+    canvas_width = image.width + abs(offset[0]) + extra_margin
+    canvas_height = image.height + abs(offset[1]) + extra_margin
+    shadow_x = extra_margin // 2 + max(offset[0], 0)
+    shadow_y = extra_margin // 2 + max(offset[1], 0)
+
+    mask = Image.new("L", (canvas_width, canvas_height), 0)
+    mask.paste(alpha, (shadow_x, shadow_y))
+    mask = blur_mask(mask, blur_radius)
+
+    shadow = Image.new("RGBA", mask.size, (*color, 0))
+    shadow.putalpha(mask)
+
+    return shadow, (shadow_x, shadow_y)
+
+
+def blur_mask(mask: Image.Image, radius: int) -> Image.Image:
+    if radius <= 0:
+        return mask
+
+    factor = max(1, radius // MIN_REDUCED_RADIUS)
+    if factor == 1:
+        return mask.filter(ImageFilter.GaussianBlur(radius))
+
+    width, height = mask.size
+    reduced = mask.reduce(factor)
+    reduced = reduced.filter(ImageFilter.GaussianBlur(radius / factor))
+    enlarged = reduced.resize((reduced.width * factor, reduced.height * factor), Image.Resampling.BILINEAR)
+
+    return enlarged.crop((0, 0, width, height))
@@ -54,6 +54,9 @@ class SolidBackground(Background):
         alpha_value = int(self.alpha * 255)
         return Image.new('RGBA', (width, height), (*rgb, alpha_value))
 
+    def prepare_band(self, width: int, height: int, top: int, bottom: int) -> Image.Image:
+        return self.prepare_image(width, bottom - top)
+
 
 class ColorPresetButton(Gtk.Button):
     def __init__(self, color: str, alpha: float = 1.0, tooltip_text: str = "", **kwargs) -> None:
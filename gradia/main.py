@@ -29,6 +29,8 @@ from gradia.constants import app_id, rootdir  # pyright: ignore
 from gradia.ui.window import GradiaMainWindow
 from gradia.backend.logger import Logger
 from gradia.utils.std_image_loader import StdinImageLoader
+from gradia.backend.batch import run_batch
+from gradia.backend.tracing import get_trace_path_from_env, tracer
 from gradia.backend.ocr import OCR
 logging = Logger()
 
@@ -139,9 +141,17 @@ class GradiaApp(Adw.Application):
                 logging.warning(f"Failed to clean up temp dir {temp_dir}.", exception=e, show_exception=True)
         logging.info("Cleanup complete.")
 
+        trace_path = get_trace_path_from_env()
+        if trace_path and tracer.enabled:
+            event_count = tracer.dump(trace_path)
+            logging.info(f"Wrote {event_count} trace events to {trace_path}")
+
 def main(version: str) -> int:
     try:
         logging.info("Application starting…")
+        if "--batch" in sys.argv[1:]:
+            return run_batch(sys.argv[1:])
+
         loader = StdinImageLoader()
         image_path = loader.read_from_stdin()
 
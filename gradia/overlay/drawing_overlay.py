@@ -16,12 +16,14 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import cairo
+import math
 from gi.repository import Adw, Gdk, Gio, Gtk, GObject
 from typing import Tuple
 from enum import Enum
 
 from gradia.overlay.drawing_actions import *
 from gradia.overlay.text_entry_popover import TextEntryPopover
+from gradia.backend.tracing import traced
 
 HANDLE_SIZE = 8
 
@@ -76,6 +78,7 @@ class DrawingOverlay(Gtk.DrawingArea):
         self.actions: list[DrawingAction] = []
         self.redo_stack = []
         self._next_number = 1
+        self.generation = 0
 
         self._selected_action: DrawingAction | None = None
         self.selection_start_pos = None
@@ -96,6 +99,11 @@ class DrawingOverlay(Gtk.DrawingArea):
 
         self._setup_gestures()
 
+    def _mark_changed(self) -> None:
+        # Exports are cached per generation, so only changes to the actions
+        # count as edits, not redraws for hovering or selection.
+        self.generation += 1
+
     def set_picture_reference(self, picture: Gtk.Picture) -> None:
         self.picture_widget = picture
         picture.connect("notify::paintable", lambda *args: self.queue_draw())
@@ -320,6 +328,7 @@ class DrawingOverlay(Gtk.DrawingArea):
             self.actions.remove(self.selected_action)
             self.selected_action = None
             self.redo_stack.clear()
+            self._mark_changed()
 
             if was_number_action:
                 self._renumber_actions()
@@ -429,6 +438,7 @@ class DrawingOverlay(Gtk.DrawingArea):
             self.actions.append(number_action)
             self._renumber_actions()
             self.redo_stack.clear()
+            self._mark_changed()
             self._update_undo_redo_action_states()
             self.queue_draw()
 
@@ -503,6 +513,7 @@ class DrawingOverlay(Gtk.DrawingArea):
         if self.editing_text_action:
             self.editing_text_action.font_size = font_size
             self.editing_text_action.font_size = font_size
+            self._mark_changed()
             if self.selected_action == self.editing_text_action:
                 self.queue_draw()
         else:
@@ -526,6 +537,7 @@ class DrawingOverlay(Gtk.DrawingArea):
                     if self.selected_action == self.editing_text_action:
                         self.selected_action = None
                 self.redo_stack.clear()
+                self._mark_changed()
                 self._update_undo_redo_action_states()
             else:
                 if text:
@@ -542,6 +554,7 @@ class DrawingOverlay(Gtk.DrawingArea):
                     )
                     self.actions.append(action)
                     self.redo_stack.clear()
+                    self._mark_changed()
                     self._update_undo_redo_action_states()
 
         self._cleanup_text_entry()
@@ -553,6 +566,7 @@ class DrawingOverlay(Gtk.DrawingArea):
         self.live_text = self.text_entry_popup.get_text().strip()
         if self.editing_text_action:
             self.editing_text_action.text = self.live_text
+            self._mark_changed()
 
         self.queue_draw()
 
@@ -632,6 +646,7 @@ class DrawingOverlay(Gtk.DrawingArea):
         if self.options.mode == DrawingMode.SELECT and self.is_resizing and self.selected_action and self.resize_start_bounds:
             self._resize_action(self.selected_action, self.resize_handle, self.resize_start_bounds,
                               self.resize_start_mouse, (img_x, img_y), self.current_shift_pressed)
+            self._mark_changed()
             self.queue_draw()
             return
 
@@ -641,6 +656,7 @@ class DrawingOverlay(Gtk.DrawingArea):
             delta_y_img = img_y - old_y_img
             self.selected_action.translate(delta_x_img, delta_y_img)
             self.move_start_point = (img_x, img_y)
+            self._mark_changed()
             self.queue_draw()
             return
 
@@ -702,6 +718,7 @@ class DrawingOverlay(Gtk.DrawingArea):
         self.start_point = None
         self.end_point = None
         self.redo_stack.clear()
+        self._mark_changed()
         self._update_undo_redo_action_states()
         self.queue_draw()
 
@@ -810,9 +827,10 @@ class DrawingOverlay(Gtk.DrawingArea):
         if self.selected_action:
             self._draw_selection_box(cr, scale)
 
-    def export_to_pixbuf(self, requested_width, requested_height) -> GdkPixbuf.Pixbuf | None:
+    def export_onto_pixbuf(self, pixbuf: GdkPixbuf.Pixbuf, requested_width: int, requested_height: int, top: int = 0, left: int = 0) -> GdkPixbuf.Pixbuf:
+        """Draw the annotations over `pixbuf`, the region at (`left`, `top`) of the requested canvas."""
         if not self.picture_widget or not self.picture_widget.get_paintable():
-            return None
+            return pixbuf
 
         paintable = self.picture_widget.get_paintable()
         img_w = paintable.get_intrinsic_width()
@@ -821,7 +839,7 @@ class DrawingOverlay(Gtk.DrawingArea):
         scale_factor_x = requested_width / img_w
         scale_factor_y = requested_height / img_h
 
-        return render_actions_to_pixbuf(self.actions, requested_width, requested_height, scale_factor_x, scale_factor_y)
+        return render_actions_onto_pixbuf(self.actions, pixbuf, requested_width, requested_height, scale_factor_x, scale_factor_y, top, left)
 
     def clear_drawing(self) -> None:
         self._close_text_entry()
@@ -829,6 +847,7 @@ class DrawingOverlay(Gtk.DrawingArea):
         self.redo_stack.clear()
         self.selected_action = None
         self._next_number = 1
+        self._mark_changed()
         self._update_undo_redo_action_states()
         self.queue_draw()
 
@@ -837,6 +856,7 @@ class DrawingOverlay(Gtk.DrawingArea):
             undone_action = self.actions.pop()
             self.redo_stack.append(undone_action)
             self.selected_action = None
+            self._mark_changed()
 
             if isinstance(undone_action, NumberStampAction):
                 self._renumber_actions()
@@ -849,6 +869,7 @@ class DrawingOverlay(Gtk.DrawingArea):
             redone_action = self.redo_stack.pop()
             self.actions.append(redone_action)
             self.selected_action = None
+            self._mark_changed()
 
             if isinstance(redone_action, NumberStampAction):
                 self._renumber_actions()
@@ -875,16 +896,25 @@ class DrawingOverlay(Gtk.DrawingArea):
         return self.get_visible()
 
 
-def render_actions_to_pixbuf(actions: list[DrawingAction], width: int, height: int, scale_factor_x: float = 1.0, scale_factor_y: float = 1.0) -> GdkPixbuf.Pixbuf | None:
-    if width <= 0 or height <= 0:
-        return None
+@traced("render-annotations")
+def render_actions_onto_pixbuf(actions: list[DrawingAction], pixbuf: GdkPixbuf.Pixbuf, width: int, height: int, scale_factor_x: float = 1.0, scale_factor_y: float = 1.0, top: int = 0, left: int = 0) -> GdkPixbuf.Pixbuf:
+    """
+    Draw the actions over `pixbuf`, the region at (`left`, `top`) of a
+    width x height canvas, and return the result as a new pixbuf.
 
-    surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
-    cr = cairo.Context(surface)
+    The actions are recorded first, so only the box they actually cover is
+    premultiplied into a cairo surface, drawn on and written back. Pixels
+    outside it are copied as is. Without actions the pixbuf is returned
+    unchanged.
+    """
+    if not actions:
+        return pixbuf
 
-    cr.set_operator(cairo.Operator.CLEAR)
-    cr.paint()
-    cr.set_operator(cairo.Operator.OVER)
+    columns = pixbuf.get_width()
+    rows = pixbuf.get_height()
+    recording = cairo.RecordingSurface(cairo.Content.COLOR_ALPHA, None)
+    cr = cairo.Context(recording)
+    cr.translate(-left, -top)
 
     def image_coords_to_intrinsic_pixels(x_image: int, y_image: int) -> Tuple[float, float]:
         center_x_intrinsic = width / 2.0
@@ -899,6 +929,27 @@ def render_actions_to_pixbuf(actions: list[DrawingAction], width: int, height: i
     for action in actions:
         action.draw(cr, image_coords_to_intrinsic_pixels, scale_factor)
 
+    ink_x, ink_y, ink_width, ink_height = recording.ink_extents()
+    box_left = max(0, math.floor(ink_x))
+    box_top = max(0, math.floor(ink_y))
+    box_right = min(columns, math.ceil(ink_x + ink_width))
+    box_bottom = min(rows, math.ceil(ink_y + ink_height))
+    if box_left >= box_right or box_top >= box_bottom:
+        return pixbuf
+    box_width = box_right - box_left
+    box_height = box_bottom - box_top
+
+    surface = cairo.ImageSurface(cairo.Format.ARGB32, box_width, box_height)
+    box_cr = cairo.Context(surface)
+    box_cr.set_operator(cairo.Operator.SOURCE)
+    Gdk.cairo_set_source_pixbuf(box_cr, pixbuf, -box_left, -box_top)
+    box_cr.paint()
+    box_cr.set_operator(cairo.Operator.OVER)
+    box_cr.set_source_surface(recording, -box_left, -box_top)
+    box_cr.paint()
     surface.flush()
 
-    return Gdk.pixbuf_get_from_surface(surface, 0, 0, width, height)
+    annotated = Gdk.pixbuf_get_from_surface(surface, 0, 0, box_width, box_height)
+    result = pixbuf.copy() if pixbuf.get_has_alpha() else pixbuf.add_alpha(False, 0, 0, 0)
+    annotated.copy_area(0, 0, box_width, box_height, result, box_left, box_top)
+    return result
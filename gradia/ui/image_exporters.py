@@ -15,20 +15,43 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import filecmp
 import os
 import subprocess
 import threading
 import time
+from collections.abc import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
 
 
-from gi.repository import Gtk, Gio, GdkPixbuf, GLib, Gdk
-from gradia.clipboard import copy_text_to_clipboard, save_pixbuff_to_path, copy_pixbuf_to_clipboard
+from gi.repository import Adw, Gtk, Gio, GdkPixbuf, GLib, Gdk
+from PIL import Image
+from gradia.clipboard import copy_text_to_clipboard, copy_pixbuf_to_clipboard, hand_off_clipboard, ImageContentProvider
 from gradia.backend.logger import Logger
 from gradia.app_constants import SUPPORTED_EXPORT_FORMATS, DEFAULT_EXPORT_FORMAT
 from gradia.backend.settings import Settings
+from gradia.backend.tracing import span, traced
+from gradia.graphics.palette import encode_palette_png
+from gradia.graphics.png_writer import PngWriter, PNG_PRESETS
 
 ExportFormat = tuple[str, str, str]
 
+# Rough number of bytes held per canvas pixel while a band is exported: the
+# band, its pixbuf, the annotation surface, its pixbuf and encoder copies.
+BAND_BYTES_PER_PIXEL = 40
+
+# Files in these formats are exported as they are when nothing was edited.
+PASSTHROUGH_FORMATS = {"PNG": "png", "JPEG": "jpeg", "WEBP": "webp"}
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Saves that take longer than this show their progress.
+PROGRESS_DELAY_MS = 400
+
+# Range of qualities searched when an export has to fit a size budget.
+BUDGET_MIN_QUALITY = 30
+BUDGET_MAX_QUALITY = 95
+
 logger = Logger()
 
 class SystemNotifier:
@@ -48,6 +71,95 @@ class SystemNotifier:
         notification_id = "screenshot-notification"
         app.send_notification(notification_id, notification)
 
+class ExportProgress:
+    """
+    A toast showing how far a long export got, with a button to cancel it.
+
+    Nothing is shown for exports that finish within PROGRESS_DELAY_MS.
+    """
+
+    def __init__(self, window: Gtk.ApplicationWindow, cancellable: Gio.Cancellable) -> None:
+        self.window = window
+        self.cancellable = cancellable
+        self._fraction = 0.0
+        self._toast: Optional[Adw.Toast] = None
+        self._timeout_id = GLib.timeout_add(PROGRESS_DELAY_MS, self._show)
+
+    def update(self, fraction: float) -> None:
+        """Report progress from any thread."""
+        GLib.idle_add(self._update, fraction)
+
+    def finish(self) -> None:
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = 0
+        if self._toast:
+            self._toast.dismiss()
+            self._toast = None
+
+    def _show(self) -> bool:
+        self._timeout_id = 0
+        self._toast = Adw.Toast.new(self._get_title())
+        self._toast.set_timeout(0)
+        self._toast.set_button_label(_("Cancel"))
+        self._toast.connect("button-clicked", lambda *_: self.cancellable.cancel())
+        self.window.toast_overlay.add_toast(self._toast)
+        return False
+
+    def _update(self, fraction: float) -> bool:
+        self._fraction = fraction
+        if self._toast:
+            self._toast.set_title(self._get_title())
+        return False
+
+    def _get_title(self) -> str:
+        return _("Saving… {percent}%").format(percent=int(self._fraction * 100))
+
+
+class ExportCache:
+    """
+    The last composited export of a window and its encodings per format.
+
+    Entries belong to the edit generation they were made for. Looking up or
+    storing a newer generation drops everything older, so at most one
+    composite is kept.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._generation = -1
+        self._pixbuf: Optional[GdkPixbuf.Pixbuf] = None
+        self._encoded: dict[Hashable, bytes] = {}
+
+    def get_pixbuf(self, generation: int) -> Optional[GdkPixbuf.Pixbuf]:
+        with self._lock:
+            self._advance(generation)
+            return self._pixbuf if generation == self._generation else None
+
+    def store_pixbuf(self, generation: int, pixbuf: GdkPixbuf.Pixbuf) -> None:
+        with self._lock:
+            self._advance(generation)
+            if generation == self._generation:
+                self._pixbuf = pixbuf
+
+    def get_encoded(self, generation: int, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            self._advance(generation)
+            return self._encoded.get(key) if generation == self._generation else None
+
+    def store_encoded(self, generation: int, key: Hashable, data: bytes) -> None:
+        with self._lock:
+            self._advance(generation)
+            if generation == self._generation:
+                self._encoded[key] = data
+
+    def _advance(self, generation: int) -> None:
+        if generation > self._generation:
+            self._generation = generation
+            self._pixbuf = None
+            self._encoded = {}
+
+
 class BaseImageExporter:
     """Base class for image export handlers"""
 
@@ -55,47 +167,183 @@ class BaseImageExporter:
         self.window: Gtk.ApplicationWindow = window
         self.temp_dir: str = temp_dir
 
-    def get_processed_pixbuf(self):
-        full_res_pixbuf = self.window.processor.process_full_resolution()
-        width = full_res_pixbuf.get_width()
-        height = full_res_pixbuf.get_height()
-        drawing_pixbuf = self.window.drawing_overlay.export_to_pixbuf(width, height)
-
-        composited = self.overlay_pixbuffs(
-            full_res_pixbuf,
-            drawing_pixbuf,
-        )
+    def get_processed_pixbuf(self, cancellable: Optional[Gio.Cancellable] = None) -> GdkPixbuf.Pixbuf:
+        """The annotated and cropped full resolution image, rendered once per edit generation."""
+        return self.get_processed_generation(cancellable)[1]
+
+    def get_processed_generation(self, cancellable: Optional[Gio.Cancellable] = None) -> tuple[int, GdkPixbuf.Pixbuf]:
+        """
+        The processed image as by `get_processed_pixbuf()`, along with the
+        edit generation it was rendered for, so encodings of it are cached
+        under that generation even if the image is edited since.
+        """
+        generation = self.window.get_edit_generation()
+        pixbuf = self.window.export_cache.get_pixbuf(generation)
+        if pixbuf is None:
+            pixbuf = self._render_processed_pixbuf(cancellable)
+            # An edit during the render may have mixed options, so only cache what is still current.
+            if self.window.get_edit_generation() == generation:
+                self.window.export_cache.store_pixbuf(generation, pixbuf)
+        return generation, pixbuf
+
+    def get_encoded_image(
+        self,
+        format_type: str,
+        generation: Optional[int] = None,
+        pixbuf: Optional[GdkPixbuf.Pixbuf] = None
+    ) -> bytes:
+        """
+        The processed image encoded as `format_type`, encoded once per edit generation.
+
+        A `pixbuf` processed for an earlier `generation` can be passed to
+        encode that one instead of the current image.
+        """
+        if pixbuf is None:
+            generation, pixbuf = self.get_processed_generation()
+        elif generation is None:
+            generation = self.window.get_edit_generation()
+        settings = Settings()
+        key = (format_type, settings.export_compress, settings.png_compression_preset, settings.png_palette_dither)
+        data = self.window.export_cache.get_encoded(generation, key)
+        if data is None:
+            data = self.encode_pixbuf(pixbuf, format_type)
+            self.window.export_cache.store_encoded(generation, key, data)
+        return data
+
+    def get_passthrough_format(self) -> Optional[str]:
+        """
+        The export format of the loaded file when nothing was edited, so its
+        original bytes can be used as the export unchanged.
+        """
+        if self.window.drawing_overlay.actions:
+            return None
+        if self.window.image_bin.crop_overlay.get_crop_rectangle() != (0.0, 0.0, 1.0, 1.0):
+            return None
+        if not self.window.processor.is_identity():
+            return None
+        return PASSTHROUGH_FORMATS.get(self.window.image.file_format)
+
+    def write_original(self, write: Callable[[bytes], Any]) -> None:
+        with open(self.window.image.image_path, "rb") as source:
+            for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+                write(chunk)
+
+    def create_clipboard_provider(self, pixbuf: GdkPixbuf.Pixbuf, generation: int) -> ImageContentProvider:
+        """
+        Clipboard content for `pixbuf`, the processed image of edit
+        `generation`, offered as PNG, WebP and JPEG.
+
+        Nothing is encoded until a format is pasted. Encodings are shared with
+        exports of the same generation, and an unedited PNG is read from the
+        loaded file right away, as that file may change or go away before
+        the paste.
+        """
+        format_types = {"image/png": self.get_png_format(), "image/webp": "webp", "image/jpeg": "jpeg"}
+        encoded = {}
+        if format_types["image/png"] == "png" and self.get_passthrough_format() == "png":
+            chunks = []
+            self.write_original(chunks.append)
+            encoded["image/png"] = b"".join(chunks)
+
+        def encode(mime_type: str) -> bytes:
+            with span("clipboard-encode", mime_type=mime_type):
+                return self.get_encoded_image(format_types[mime_type], generation, pixbuf)
+
+        return ImageContentProvider(format_types, encode, encoded)
+
+    @traced("export-size-budget")
+    def get_encoded_image_within(self, budget: int) -> tuple[str, bytes]:
+        """
+        The best looking encoding of the processed image that fits in
+        `budget` bytes, as a format key and the encoded bytes.
+
+        Lossless PNG wins when it fits. Otherwise each lossy format is
+        bisected to its highest quality under budget, all formats in
+        parallel, and the highest quality wins. When nothing fits the
+        smallest encoding is returned.
+        """
+        generation, pixbuf = self.get_processed_generation()
+        png_format = self.get_png_format()
+        png_data = self.get_encoded_image(png_format, generation, pixbuf)
+        if len(png_data) <= budget:
+            return png_format, png_data
+
+        lossy_formats = [
+            format_type for format_type, format_info in SUPPORTED_EXPORT_FORMATS.items()
+            if "quality" in format_info['save_options']['keys']
+        ]
+        with ThreadPoolExecutor(max(1, len(lossy_formats))) as pool:
+            results = list(pool.map(
+                lambda format_type: self._search_quality(generation, pixbuf, format_type, budget),
+                lossy_formats
+            ))
+
+        candidates = [(format_type, quality, data) for format_type, (quality, data) in zip(lossy_formats, results)]
+        fitting = [candidate for candidate in candidates if len(candidate[2]) <= budget]
+        if fitting:
+            format_type, _quality, data = max(fitting, key=lambda candidate: (candidate[1], -len(candidate[2])))
+            return format_type, data
+
+        format_type, _quality, data = min(candidates + [(png_format, 100, png_data)], key=lambda candidate: len(candidate[2]))
+        logger.warning(f"No export fits in {budget} bytes, using the smallest ({len(data)} bytes)")
+        return format_type, data
+
+    def _search_quality(
+        self, generation: int, pixbuf: GdkPixbuf.Pixbuf, format_type: str, budget: int
+    ) -> tuple[int, bytes]:
+        """Bisect the highest quality that fits, or return the lowest quality when none does."""
+        if format_type == 'jpeg' and pixbuf.get_has_alpha():
+            pixbuf = self._convert_rgba_to_rgb(pixbuf)
 
+        low, high = BUDGET_MIN_QUALITY, BUDGET_MAX_QUALITY
+        best = None
+        while low <= high:
+            quality = (low + high) // 2
+            data = self._get_encoded_quality(generation, pixbuf, format_type, quality)
+            if len(data) <= budget:
+                best = (quality, data)
+                low = quality + 1
+            else:
+                high = quality - 1
+
+        if best is None:
+            best = (BUDGET_MIN_QUALITY, self._get_encoded_quality(generation, pixbuf, format_type, BUDGET_MIN_QUALITY))
+        return best
+
+    def get_png_format(self) -> str:
+        """The PNG flavour used where only PNG makes sense, palette PNG when that is the preferred format."""
+        return "png8" if Settings().export_format == "png8" else "png"
+
+    def _get_encoded_quality(self, generation: int, pixbuf: GdkPixbuf.Pixbuf, format_type: str, quality: int) -> bytes:
+        key = (format_type, "quality", quality)
+        data = self.window.export_cache.get_encoded(generation, key)
+        if data is None:
+            data = self.encode_pixbuf(pixbuf, format_type, quality)
+            self.window.export_cache.store_encoded(generation, key, data)
+        return data
+
+    @traced("export-render")
+    def _render_processed_pixbuf(self, cancellable: Optional[Gio.Cancellable] = None) -> GdkPixbuf.Pixbuf:
         crop_rect = self.window.image_bin.crop_overlay.get_crop_rectangle()
-        return self.crop_pixbuf(composited, crop_rect)
-
-    def overlay_pixbuffs(self, bottom: GdkPixbuf.Pixbuf, top: GdkPixbuf.Pixbuf, alpha: float = 1) -> GdkPixbuf.Pixbuf:
-        if bottom.get_width() != top.get_width() or bottom.get_height() != top.get_height():
-            raise ValueError("Pixbufs must be the same size to overlay")
-
-        width = bottom.get_width()
-        height = bottom.get_height()
+        if crop_rect != (0.0, 0.0, 1.0, 1.0):
+            return self._render_cropped_pixbuf(crop_rect, cancellable)
 
-        result = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, width, height)
-        result.fill(0x00000000)
+        full_res_pixbuf = self.window.processor.process_full_resolution(cancellable)
+        width = full_res_pixbuf.get_width()
+        height = full_res_pixbuf.get_height()
+        return self.window.drawing_overlay.export_onto_pixbuf(full_res_pixbuf, width, height)
 
-        bottom.composite(
-            result,
-            0, 0, width, height,
-            0, 0, 1.0, 1.0,
-            GdkPixbuf.InterpType.BILINEAR,
-            255
-        )
+    def _render_cropped_pixbuf(
+        self, crop_rect: tuple[float, float, float, float], cancellable: Optional[Gio.Cancellable] = None
+    ) -> GdkPixbuf.Pixbuf:
+        """Render, annotate and composite only the cropped region of the canvas."""
+        width, height = self.window.processor.get_full_resolution_size(cancellable)
+        crop_px, crop_py, crop_pw, crop_ph = self._get_crop_box(crop_rect, width, height)
 
-        top.composite(
-            result,
-            0, 0, width, height,
-            0, 0, 1.0, 1.0,
-            GdkPixbuf.InterpType.BILINEAR,
-            int(255 * alpha)
+        region_pixbuf = self.window.processor.process_full_resolution_region(
+            (crop_px, crop_py, crop_px + crop_pw, crop_py + crop_ph), cancellable
         )
-
-        return result
+        return self.window.drawing_overlay.export_onto_pixbuf(region_pixbuf, width, height, crop_py, crop_px)
 
     def _get_dynamic_filename(self, extension: str = ".png") -> str:
         original_name = self.window.image.get_proper_name(with_extension=False)
@@ -106,15 +354,9 @@ class BaseImageExporter:
         return f"{_('Enhanced Screenshot')}{extension}"
 
 
-    def crop_pixbuf(self, pixbuf: GdkPixbuf.Pixbuf, crop: tuple[float, float, float, float]) -> GdkPixbuf.Pixbuf:
+    def _get_crop_box(self, crop: tuple[float, float, float, float], width: int, height: int) -> tuple[int, int, int, int]:
         crop_x, crop_y, crop_w, crop_h = crop
 
-        if (crop_x, crop_y, crop_w, crop_h) == (0.0, 0.0, 1.0, 1.0):
-            return pixbuf
-
-        width = pixbuf.get_width()
-        height = pixbuf.get_height()
-
         crop_px = int(crop_x * width)
         crop_py = int(crop_y * height)
         crop_pw = int(crop_w * width)
@@ -123,7 +365,137 @@ class BaseImageExporter:
         crop_pw = max(1, min(crop_pw, width - crop_px))
         crop_ph = max(1, min(crop_ph, height - crop_py))
 
-        return GdkPixbuf.Pixbuf.new_subpixbuf(pixbuf, crop_px, crop_py, crop_pw, crop_ph)
+        return crop_px, crop_py, crop_pw, crop_ph
+
+    def encode_pixbuf(self, pixbuf: GdkPixbuf.Pixbuf, format_type: str, quality: Optional[int] = None) -> bytes:
+        format_info = SUPPORTED_EXPORT_FORMATS.get(format_type)
+        if not format_info:
+            raise Exception("Unsupported format")
+        if format_type == 'png':
+            chunks = []
+            self._write_png_pixbuf(chunks.append, pixbuf)
+            return b"".join(chunks)
+        if format_type == 'png8':
+            with span("encode", format=format_type):
+                return encode_palette_png(
+                    self._pixbuf_to_image(pixbuf),
+                    PNG_PRESETS[Settings().png_compression_preset],
+                    dither=Settings().png_palette_dither
+                )
+        if format_type.lower() == 'jpeg' and pixbuf.get_has_alpha():
+            pixbuf = self._convert_rgba_to_rgb(pixbuf)
+        save_options = format_info['save_options']
+        save_keys = save_options['keys'][:]
+        save_values = save_options['values'][:]
+        if quality is not None:
+            save_values = [str(quality) if key == "quality" else value for key, value in zip(save_keys, save_values)]
+        elif not Settings().export_compress:
+            for i in reversed(range(len(save_keys))):
+                key_lower = save_keys[i].lower()
+                if "compression" in key_lower or "quality" in key_lower:
+                    del save_keys[i]
+                    del save_values[i]
+        with span("encode", format=format_type):
+            success, buffer = pixbuf.save_to_bufferv(format_type, save_keys, save_values)
+        if not success:
+            raise Exception("Failed to encode image")
+        return buffer
+
+    def _pixbuf_to_image(self, pixbuf: GdkPixbuf.Pixbuf) -> Image.Image:
+        mode = "RGBA" if pixbuf.get_has_alpha() else "RGB"
+        width, height = pixbuf.get_width(), pixbuf.get_height()
+        data = pixbuf.read_pixel_bytes().get_data()
+        rowstride = pixbuf.get_rowstride()
+        row_bytes = width * len(mode)
+        # The last row of a subpixbuf ends at its own width, short of a full rowstride.
+        if rowstride != row_bytes:
+            data = b"".join(data[y * rowstride:y * rowstride + row_bytes] for y in range(height))
+        return Image.frombytes(mode, (width, height), data)
+
+    def _convert_rgba_to_rgb(self, pixbuf: GdkPixbuf.Pixbuf) -> GdkPixbuf.Pixbuf:
+        rgb_pixbuf = GdkPixbuf.Pixbuf.new(
+            GdkPixbuf.Colorspace.RGB,
+            False,
+            8,
+            pixbuf.get_width(),
+            pixbuf.get_height()
+        )
+        rgb_pixbuf.fill(0xffffffff)
+        pixbuf.composite(
+            rgb_pixbuf,
+            0, 0,
+            pixbuf.get_width(), pixbuf.get_height(),
+            0, 0,
+            1.0, 1.0,
+            GdkPixbuf.InterpType.BILINEAR,
+            255
+        )
+        return rgb_pixbuf
+
+    def needs_bands(self) -> bool:
+        """Whether the image is too large for the export tile budget to render in one piece."""
+        width, height = self.window.processor.get_full_resolution_size()
+        return self._get_band_height(width) < height
+
+    def _get_band_height(self, width: int) -> int:
+        return max(1, Settings().export_tile_budget * 1024 * 1024 // (width * BAND_BYTES_PER_PIXEL))
+
+    @traced("export-png")
+    def write_png(
+        self,
+        write: Callable[[bytes], Any],
+        cancellable: Optional[Gio.Cancellable] = None,
+        progress: Optional[Callable[[float], None]] = None
+    ) -> None:
+        """
+        Encode the processed image as PNG through `write`.
+
+        Images too large for the export tile budget are rendered, annotated
+        and encoded band by band, reporting the fraction done to `progress`
+        after each. The file is the same either way.
+        """
+        processor = self.window.processor
+        width, height = processor.get_full_resolution_size(cancellable)
+        band_height = self._get_band_height(width)
+
+        if band_height >= height:
+            generation, pixbuf = self.get_processed_generation(cancellable)
+            write(self.get_encoded_image("png", generation, pixbuf))
+            return
+
+        logger.debug(f"Exporting {width}x{height} in bands of {band_height} rows")
+        crop_rect = self.window.image_bin.crop_overlay.get_crop_rectangle()
+        crop_px, crop_py, crop_pw, crop_ph = self._get_crop_box(crop_rect, width, height)
+        writer = self._create_png_writer(write, crop_pw, crop_ph, True)
+
+        top = 0
+        for band in processor.process_full_resolution_bands(band_height, cancellable):
+            if cancellable:
+                cancellable.set_error_if_cancelled()
+            rows = band.get_height()
+            band = self.window.drawing_overlay.export_onto_pixbuf(band, width, height, top)
+
+            first = max(top, crop_py)
+            last = min(top + rows, crop_py + crop_ph)
+            if first < last:
+                visible = GdkPixbuf.Pixbuf.new_subpixbuf(band, crop_px, first - top, crop_pw, last - first)
+                with span("encode-png", rows=last - first):
+                    writer.write_rows(visible.read_pixel_bytes().get_data(), visible.get_rowstride(), last - first)
+            top += rows
+            if progress:
+                progress(top / height)
+
+        writer.close()
+
+    def _create_png_writer(self, write: Callable[[bytes], Any], width: int, height: int, has_alpha: bool) -> PngWriter:
+        compress_level = PNG_PRESETS[Settings().png_compression_preset]
+        return PngWriter(write, width, height, has_alpha, compress_level, threads=os.cpu_count() or 1)
+
+    @traced("encode-png")
+    def _write_png_pixbuf(self, write: Callable[[bytes], Any], pixbuf: GdkPixbuf.Pixbuf) -> None:
+        writer = self._create_png_writer(write, pixbuf.get_width(), pixbuf.get_height(), pixbuf.get_has_alpha())
+        writer.write_rows(pixbuf.read_pixel_bytes().get_data(), pixbuf.get_rowstride(), pixbuf.get_height())
+        writer.close()
 
     def _ensure_processed_image_available(self) -> bool:
         """Ensure processed image is available for export"""
@@ -168,7 +540,7 @@ class FileDialogExporter(BaseImageExporter):
             if file:
                 save_path = file.get_path()
 
-                format_type = self._get_format_from_extension(save_path)
+                format_type = self._get_format_from_extension(save_path, suggested_format)
 
                 if format_type not in SUPPORTED_EXPORT_FORMATS:
                     self.window._show_notification(_("Unsupported image file extension"))
@@ -177,18 +549,69 @@ class FileDialogExporter(BaseImageExporter):
 
                 save_path = self._ensure_correct_extension(save_path, format_type)
                 logger.debug(f"Saving to: {save_path} as {format_type}")
+                self._save_image_async(save_path, format_type)
+
+        dialog.destroy()
+
+    def _save_image_async(self, save_path: str, format_type: str) -> None:
+        """
+        Save in the background, streaming the encoded image into a replacement
+        of `save_path` that only takes its place once complete.
+        """
+        file = Gio.File.new_for_path(save_path)
+        cancellable = Gio.Cancellable()
+        progress = ExportProgress(self.window, cancellable)
+
+        def _on_task_complete(source_object, result, user_data):
+            progress.finish()
+            try:
+                result.propagate_boolean()
+                self.window.show_close_confirmation = False
+                self.window._show_notification(_("Image Saved"))
+            except GLib.Error as e:
+                if e.matches(Gio.io_error_quark(), Gio.IOErrorEnum.CANCELLED):
+                    self.window._show_notification(_("Saving Cancelled"))
+                else:
+                    self.window._show_notification(_("Export Failed"))
+                    logger.error(f"Failed to save image: {e.message}")
+
+        def _on_replace_ready(file, result, user_data):
+            task = Gio.Task.new(None, cancellable, _on_task_complete, None)
+            try:
+                output_stream = file.replace_finish(result)
+            except GLib.Error as e:
+                task.return_error(e)
+                return
+
+            def _task_thread_func(task, source_object, task_data, cancellable):
                 try:
-                    self._save_image(save_path, format_type)
-                    self.window.show_close_confirmation = False
-                    self.window._show_notification(_("Image Saved"))
+                    self._encode_image(
+                        lambda data: output_stream.write_all(data, cancellable),
+                        format_type, cancellable, progress.update
+                    )
+                    output_stream.close(cancellable)
+                    task.return_boolean(True)
                 except Exception as e:
-                    self.window._show_notification(_("Export Failed"))
-                    logger.error(f"Failed to save image: {e}")
+                    self._abort_output(output_stream)
+                    if isinstance(e, GLib.Error):
+                        task.return_error(e)
+                    else:
+                        task.return_error(GLib.Error.new_literal(Gio.io_error_quark(), str(e), 0))
 
-        dialog.destroy()
+            task.run_in_thread(_task_thread_func)
+
+        file.replace_async(
+            None, False, Gio.FileCreateFlags.REPLACE_DESTINATION, GLib.PRIORITY_DEFAULT,
+            cancellable, _on_replace_ready, None
+        )
 
-    def _get_format_from_extension(self, file_path: str) -> str:
+    def _get_format_from_extension(self, file_path: str, preferred_format: str = None) -> str:
         path_lower = file_path.lower()
+        # Several formats share an extension, so keep the one that was asked for.
+        if preferred_format in SUPPORTED_EXPORT_FORMATS:
+            for ext in SUPPORTED_EXPORT_FORMATS[preferred_format]['extensions']:
+                if path_lower.endswith(ext.lower()):
+                    return preferred_format
         for format_key, format_info in SUPPORTED_EXPORT_FORMATS.items():
             for ext in format_info['extensions']:
                 if path_lower.endswith(ext.lower()):
@@ -214,52 +637,56 @@ class FileDialogExporter(BaseImageExporter):
                 return format_key
         return None
 
-    def _convert_rgba_to_rgb(self, pixbuf: GdkPixbuf.Pixbuf) -> GdkPixbuf.Pixbuf:
-        rgb_pixbuf = GdkPixbuf.Pixbuf.new(
-            GdkPixbuf.Colorspace.RGB,
-            False,
-            8,
-            pixbuf.get_width(),
-            pixbuf.get_height()
-        )
-        rgb_pixbuf.fill(0xffffffff)
-        pixbuf.composite(
-            rgb_pixbuf,
-            0, 0,
-            pixbuf.get_width(), pixbuf.get_height(),
-            0, 0,
-            1.0, 1.0,
-            GdkPixbuf.InterpType.BILINEAR,
-            255
-        )
-        return rgb_pixbuf
-
-    def _save_image_pixbuf(self, pixbuf: GdkPixbuf.Pixbuf, save_path: str, format_type: str) -> None:
-        format_info = SUPPORTED_EXPORT_FORMATS.get(format_type)
-        if not format_info:
-            raise Exception("Unsupported format")
-        if format_type.lower() == 'jpeg' and pixbuf.get_has_alpha():
-            pixbuf = self._convert_rgba_to_rgb(pixbuf)
-        save_options = format_info['save_options']
-        save_keys = save_options['keys'][:]
-        save_values = save_options['values'][:]
-        if not self.settings.export_compress:
-            for i in reversed(range(len(save_keys))):
-                key_lower = save_keys[i].lower()
-                if "compression" in key_lower or "quality" in key_lower:
-                    del save_keys[i]
-                    del save_values[i]
+    def _write_to_file(self, save_path: str, encode: Callable[[Callable[[bytes], Any]], None]) -> None:
         file = Gio.File.new_for_path(save_path)
-        success, buffer = pixbuf.save_to_bufferv(format_type, save_keys, save_values)
-        if not success:
-            raise Exception("Failed to encode image")
         output_stream = file.replace(None, False, Gio.FileCreateFlags.REPLACE_DESTINATION, None)
-        output_stream.write(buffer, None)
+        try:
+            encode(lambda data: output_stream.write_all(data, None))
+        except Exception:
+            self._abort_output(output_stream)
+            raise
         output_stream.close(None)
 
+    def _abort_output(self, output_stream: Gio.FileOutputStream) -> None:
+        # Closing with a cancelled cancellable keeps the original file in place.
+        cancellable = Gio.Cancellable()
+        cancellable.cancel()
+        try:
+            output_stream.close(cancellable)
+        except GLib.Error:
+            pass
+
     def _save_image(self, save_path: str, format_type: str) -> None:
-        pixbuf = self.get_processed_pixbuf()
-        self._save_image_pixbuf(pixbuf, save_path, format_type)
+        self._write_to_file(save_path, lambda write: self._encode_image(write, format_type))
+
+    def _encode_image(
+        self,
+        write: Callable[[bytes], Any],
+        format_type: str,
+        cancellable: Optional[Gio.Cancellable] = None,
+        progress: Optional[Callable[[float], None]] = None
+    ) -> None:
+        """
+        Stream the processed image encoded as `format_type` through `write`,
+        reporting the fraction done to `progress`.
+        """
+        if format_type == 'png' and self.needs_bands():
+            self.write_png(write, cancellable, progress)
+            return
+
+        generation, pixbuf = self.get_processed_generation(cancellable)
+        if progress:
+            progress(0.4)
+        if cancellable:
+            cancellable.set_error_if_cancelled()
+
+        data = self.get_encoded_image(format_type, generation, pixbuf)
+        for offset in range(0, len(data), COPY_CHUNK_SIZE):
+            if cancellable:
+                cancellable.set_error_if_cancelled()
+            write(data[offset:offset + COPY_CHUNK_SIZE])
+            if progress:
+                progress(0.8 + 0.2 * min(1.0, (offset + COPY_CHUNK_SIZE) / len(data)))
 
     def _ensure_processed_image_available(self) -> bool:
         try:
@@ -275,10 +702,12 @@ class ClipboardExporter(BaseImageExporter):
     def copy_to_clipboard(self, silent=False) -> None:
         try:
             self._ensure_processed_image_available()
+            providers = []
 
             def _task_thread_func(task, source_object, task_data, cancellable):
                 try:
-                    pixbuf = self.get_processed_pixbuf()
+                    generation, pixbuf = self.get_processed_generation()
+                    providers.append(self.create_clipboard_provider(pixbuf, generation))
                     task.return_value(pixbuf)
                 except Exception as e:
                     task.return_error(GLib.Error.new_literal(Gio.io_error_quark(), str(e), 0))
@@ -289,7 +718,7 @@ class ClipboardExporter(BaseImageExporter):
                     if not isinstance(pixbuf, GdkPixbuf.Pixbuf):
                         raise Exception("Invalid result: expected GdkPixbuf.Pixbuf")
 
-                    copy_pixbuf_to_clipboard(pixbuf)
+                    copy_pixbuf_to_clipboard(pixbuf, providers[0])
                     if not silent:
                         self.window.show_close_confirmation = False
                         self.window._show_notification(_("Image Copied"))
@@ -330,10 +759,47 @@ class CommandLineExporter(BaseImageExporter):
     def run_custom_command(self) -> None:
         try:
             self._ensure_processed_image_available()
-            temp_path = save_pixbuff_to_path(self.temp_dir, self.get_processed_pixbuf())
-            if not temp_path or not os.path.exists(temp_path):
-                raise Exception("Failed to create temporary file for command")
+            temp_paths = []
 
+            # Searching for an encoding within the upload budget takes many encodes, so it runs off the main thread.
+            def _task_thread_func(task, source_object, task_data, cancellable):
+                try:
+                    temp_paths.append(self._write_command_input())
+                    task.return_boolean(True)
+                except Exception as e:
+                    task.return_error(GLib.Error.new_literal(Gio.io_error_quark(), str(e), 0))
+
+            def _on_task_complete(source_object, result, user_data):
+                try:
+                    result.propagate_boolean()
+                    self._run_command(temp_paths[0])
+                except Exception as e:
+                    self.window._show_notification(_("Failed to run custom export command"))
+                    logger.error(f"Error running custom export command: {e}")
+
+            task = Gio.Task.new(None, None, _on_task_complete, None)
+            task.run_in_thread(_task_thread_func)
+
+        except Exception as e:
+            self.window._show_notification(_("Failed to run custom export command"))
+            logger.error(f"Error running custom export command: {e}")
+
+    def _write_command_input(self) -> str:
+        budget = Settings().upload_size_budget * 1024
+        if budget:
+            format_type, data = self.get_encoded_image_within(budget)
+        else:
+            format_type = self.get_png_format()
+            data = self.get_encoded_image(format_type)
+
+        extension = SUPPORTED_EXPORT_FORMATS[format_type]['extensions'][0]
+        temp_path = os.path.join(self.temp_dir, f"clipboard_temp{extension}")
+        with open(temp_path, "wb") as temp_file:
+            temp_file.write(data)
+        return temp_path
+
+    def _run_command(self, temp_path: str) -> None:
+        try:
             command_template = Settings().custom_export_command
             if "$1" not in command_template:
                 raise Exception("Custom export command must include $1 as a placeholder for the image path")
@@ -387,60 +853,41 @@ class CloseHandlerExporter(BaseImageExporter):
         self.file_exporter = FileDialogExporter(window, temp_dir)
 
     def handle_close(self, copy: bool, save: bool, callback: callable = None):
+        """
+        Finish the export on close and call `callback` once it is done.
+
+        The image is rendered and the screenshot overwritten on a worker. A
+        copy is handed to the clipboard as soon as the image is ready, after
+        which the window hides; the application is held until the clipboard
+        content no longer depends on this process.
+        """
         if not copy and (not save or not self.window.image.is_screenshot()):
             if callback:
                 callback()
             return
 
-        if copy:
-            self._handle_close_sync(copy, save, callback)
-        else:
-            def run_thread():
-                self._handle_close_thread(copy, save, callback)
-            thread = threading.Thread(target=run_thread, daemon=True)
-            thread.start()
+        thread = threading.Thread(target=self._handle_close_thread, args=(copy, save, callback), daemon=True)
+        thread.start()
 
-    def _handle_close_sync(self, copy: bool, save: bool, callback: callable = None):
+    def _handle_close_thread(self, copy: bool, save: bool, callback: callable = None):
         try:
             self._ensure_processed_image_available()
-            pixbuf = self.get_processed_pixbuf()
+            generation, pixbuf = self.get_processed_generation()
             results = {'saved': False, 'copied': False, 'save_folder': None}
 
-            if save and self.window.image.is_screenshot:
-                save_path = self.window.image.screenshot_path
-                results['save_folder'] = self.window.image.get_folder_path()
-                print(save_path)
-                if save_path:
-                    format_type = self.file_exporter._get_format_from_extension(save_path)
-                    if format_type:
-                        self.file_exporter._save_image_pixbuf(pixbuf, save_path, format_type)
-                        results['saved'] = True
-
             if copy:
-                self._handle_clipboard_copy(pixbuf, results, callback)
-            else:
-                self._finish_close_operation(results, callback)
-
-        except Exception as e:
-            SystemNotifier.send_notification(_("Close Operation Failed"), _("Failed to export image"), "dialog-error")
-            logger.error(f"Error in close handler: {e}")
-            if callback:
-                callback()
+                # Claim the clipboard before saving; the window must stay mapped until then.
+                provider = self.create_clipboard_provider(pixbuf, generation)
+                GLib.idle_add(self._handle_clipboard_copy, pixbuf, provider, results)
 
-    def _handle_close_thread(self, copy: bool, save: bool, callback: callable = None):
-        try:
-            self._ensure_processed_image_available()
-            pixbuf = self.get_processed_pixbuf()
-            results = {'saved': False, 'copied': False, 'save_folder': None}
-
-            if save and self.window.image.is_screenshot:
+            if save and self.window.image.is_screenshot():
                 save_path = self.window.image.screenshot_path
-                results['save_folder'] = self.window.image.get_folder_path()
+                results['save_folder'] = os.path.dirname(save_path) if save_path else None
                 logger.info(f"Overwriting {save_path} with annotated version.")
                 if save_path:
                     format_type = self.file_exporter._get_format_from_extension(save_path)
                     if format_type:
-                        self.file_exporter._save_image_pixbuf(pixbuf, save_path, format_type)
+                        self._overwrite_screenshot(save_path, format_type)
                         results['saved'] = True
 
             GLib.idle_add(self._finish_close_operation, results, callback)
@@ -448,6 +895,18 @@ class CloseHandlerExporter(BaseImageExporter):
         except Exception as e:
             GLib.idle_add(self._on_error, e, callback)
 
+    def _overwrite_screenshot(self, save_path: str, format_type: str) -> None:
+        if self.get_passthrough_format() != format_type:
+            self.file_exporter._save_image(save_path, format_type)
+            return
+
+        image_path = self.window.image.image_path
+        if os.path.exists(save_path) and filecmp.cmp(image_path, save_path, shallow=False):
+            logger.info(f"Keeping unedited {save_path}")
+            return
+        logger.info(f"Copying unedited screenshot to {save_path}")
+        self.file_exporter._write_to_file(save_path, self.write_original)
+
     def _on_error(self, error: Exception, callback: callable):
         SystemNotifier.send_notification(_("Close Operation Failed"), _("Failed to export image"), "dialog-error")
         logger.error(f"Error in close handler: {error}")
@@ -455,20 +914,18 @@ class CloseHandlerExporter(BaseImageExporter):
             callback()
         return False
 
-    def _handle_clipboard_copy(self, pixbuf: GdkPixbuf.Pixbuf, results: dict, callback: callable):
-        def do_clipboard_copy():
-            try:
-                if copy_pixbuf_to_clipboard(pixbuf):
-                    results['copied'] = True
-                def delayed_finish():
-                    self._finish_close_operation(results, callback)
-                    return False
-                GLib.timeout_add(50, delayed_finish)
-            except Exception as e:
-                logger.error(f"Error copying to clipboard in close handler: {e}")
-                self._finish_close_operation(results, callback)
-            return False
-        GLib.timeout_add(100, do_clipboard_copy)
+    def _handle_clipboard_copy(self, pixbuf: GdkPixbuf.Pixbuf, provider: ImageContentProvider, results: dict):
+        try:
+            clipboard = copy_pixbuf_to_clipboard(pixbuf, provider)
+            if clipboard:
+                results['copied'] = True
+                application = self.window.get_application()
+                application.hold()
+                hand_off_clipboard(clipboard, application.release)
+        except Exception as e:
+            logger.error(f"Error copying to clipboard in close handler: {e}")
+        self.window.hide()
+        return False
 
     def _finish_close_operation(self, results: dict, callback: callable):
         saved, copied = results['saved'], results['copied']
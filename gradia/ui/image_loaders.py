@@ -26,12 +26,20 @@ from gradia.clipboard import save_texture_to_file
 from gradia.ui.image_creation.source_image_generator import SourceImageGeneratorWindow
 from gradia.utils.timestamp_filename import TimestampedFilenameGenerator
 from gradia.backend.logger import Logger
-from gradia.graphics.loaded_image import LoadedImage, ImageOrigin
+from gradia.backend.tracing import span
+from gradia.backend.settings import Settings
+from gradia.graphics.loaded_image import LoadedImage, ImageOrigin, resident_images
+from gradia.graphics.preview_cache import PreviewCache
 from typing import Optional, Callable
 ImportFormat = tuple[str, str]
 
 logger = Logger()
 
+preview_cache = PreviewCache(os.path.join(GLib.get_user_cache_dir(), "gradia", "previews"))
+# Only files the user opened are cached. Screenshots and clipboard images
+# must not outlive being trashed, and temporary copies are never reopened.
+CACHED_PREVIEW_ORIGINS = {ImageOrigin.FileDialog, ImageOrigin.DragDrop, ImageOrigin.CommandLine}
+
 class BaseImageLoader:
     SUPPORTED_INPUT_FORMATS: list[ImportFormat] = [
         (".png", "image/png"),
@@ -52,10 +60,18 @@ class BaseImageLoader:
 
     def _set_image_and_update_ui(self, file_path: str, origin: ImageOrigin, screenshot_path: str = None, copy_after_processing: bool = False) -> None:
         self.window.show_loading_state()
+        resident_images.budget_bytes = Settings().resident_image_budget * 1024 * 1024
 
         def load_image_thread():
             try:
-                loaded_image = LoadedImage(file_path, origin, screenshot_path)
+                with span("load-image", origin=origin.name):
+                    loaded_image = LoadedImage(
+                        file_path,
+                        origin,
+                        screenshot_path,
+                        spill_dir=self.temp_dir,
+                        preview_cache=self._get_preview_cache(file_path, origin)
+                    )
                 GLib.idle_add(self._on_image_loaded, loaded_image, copy_after_processing)
             except Exception as e:
                 logger.error(f"Error loading image in thread: {e}")
@@ -64,6 +80,17 @@ class BaseImageLoader:
         thread = threading.Thread(target=load_image_thread, daemon=True)
         thread.start()
 
+    def _get_preview_cache(self, file_path: str, origin: ImageOrigin) -> Optional[PreviewCache]:
+        if origin not in CACHED_PREVIEW_ORIGINS:
+            return None
+
+        real_path = os.path.realpath(file_path)
+        scratch_dirs = (self.temp_dir, GLib.get_tmp_dir(), os.path.join(GLib.get_user_cache_dir(), "gradia"))
+        for directory in scratch_dirs:
+            if real_path.startswith(os.path.join(os.path.realpath(directory), "")):
+                return None
+        return preview_cache
+
     def _on_image_loaded(self, loaded_image: LoadedImage, copy_after_processing: bool) -> bool:
         self.window.set_image(loaded_image, copy_after_processing=copy_after_processing)
         return False
@@ -318,7 +345,9 @@ class ScreenshotImageLoader(BaseImageLoader):
 
             shutil.copy(file_path, new_path)
 
-            self._set_image_and_update_ui(file_path, ImageOrigin.FakeScreenshot, screenshot_path=file_path, copy_after_processing=True)
+            # Load the copy: full resolution pixels are only decoded on export, by which time
+            # the original may already be in the trash.
+            self._set_image_and_update_ui(new_path, ImageOrigin.FakeScreenshot, screenshot_path=file_path, copy_after_processing=True)
 
             self.window._show_notification(_("Screenshot captured!"))
 
@@ -40,7 +40,10 @@ class PreferencesWindow(Adw.PreferencesDialog):
     delete_screenshot_switch: Adw.SwitchRow = Gtk.Template.Child()
     overwrite_screenshot_switch: Adw.SwitchRow = Gtk.Template.Child()
     confirm_upload_switch: Adw.SwitchRow = Gtk.Template.Child()
+    upload_size_budget_row: Adw.SpinRow = Gtk.Template.Child()
     save_format_combo: Adw.ComboRow = Gtk.Template.Child()
+    png_preset_combo: Adw.ComboRow = Gtk.Template.Child()
+    palette_dither_switch: Adw.SwitchRow = Gtk.Template.Child()
     provider_name: Gtk.Label = Gtk.Template.Child()
     exiting_combo: Adw.ComboRow = Gtk.Template.Child()
     folder_label: Gtk.Label = Gtk.Template.Child()
@@ -67,6 +70,7 @@ class PreferencesWindow(Adw.PreferencesDialog):
 
     def _setup_widgets(self):
         self._setup_save_format_combo()
+        self._setup_png_preset_combo()
         self._setup_exiting_combo()
         self._setup_provider_display()
         self._bind_settings()
@@ -106,6 +110,30 @@ class PreferencesWindow(Adw.PreferencesDialog):
 
         self.save_format_combo.connect("notify::selected", self._on_save_format_changed)
 
+    def _setup_png_preset_combo(self):
+        current_preset = self.settings.png_compression_preset
+        string_list = Gtk.StringList()
+
+        preset_options = [
+            ("fast", _("Fast")),
+            ("balanced", _("Balanced")),
+            ("small", _("Smallest File"))
+        ]
+        self.png_preset_keys = [key for key, _ in preset_options]
+
+        for key, display_name in preset_options:
+            string_list.append(display_name)
+
+        self.png_preset_combo.set_model(string_list)
+
+        try:
+            current_index = self.png_preset_keys.index(current_preset)
+            self.png_preset_combo.set_selected(current_index)
+        except ValueError:
+            self.png_preset_combo.set_selected(1)
+
+        self.png_preset_combo.connect("notify::selected", self._on_png_preset_changed)
+
     def _setup_exiting_combo(self):
         current_exit_method = self.settings.exit_method
         string_list = Gtk.StringList()
@@ -135,6 +163,11 @@ class PreferencesWindow(Adw.PreferencesDialog):
         if selected < len(self.format_keys):
             self.settings.export_format = self.format_keys[selected]
 
+    def _on_png_preset_changed(self, combo_row, pspec) -> None:
+        selected = combo_row.get_selected()
+        if selected < len(self.png_preset_keys):
+            self.settings.png_compression_preset = self.png_preset_keys[selected]
+
     def _on_exit_method_changed(self, combo_row, pspec) -> None:
         selected = combo_row.get_selected()
         if selected < len(self.exit_option_keys):
@@ -161,6 +194,8 @@ class PreferencesWindow(Adw.PreferencesDialog):
         self.settings.bind_switch(self.delete_screenshot_switch,"trash-screenshots-on-close")
         self.settings.bind_switch(self.confirm_upload_switch,"show-export-confirm-dialog")
         self.settings.bind_switch(self.overwrite_screenshot_switch,"overwrite-screenshot")
+        self.settings.bind_switch(self.palette_dither_switch,"png-palette-dither")
+        self.settings.bind_spin_row(self.upload_size_budget_row,"upload-size-budget")
 
     @Gtk.Template.Callback()
     def on_choose_provider_clicked(self, button: Gtk.Button) -> None:
@@ -20,7 +20,7 @@ import os
 import threading
 from typing import Any, Optional
 
-from gi.repository import Adw, GLib, GObject, Gdk, Gio, Gtk, Xdp
+from gi.repository import Adw, GLib, GObject, Gdk, GdkPixbuf, Gio, Gtk, Xdp
 
 from gradia.clipboard import *
 from gradia.graphics.background import Background
@@ -30,9 +30,9 @@ from gradia.graphics.image_processor import ImageProcessor
 from gradia.graphics.solid import SolidBackground
 from gradia.overlay.drawing_actions import DrawingMode
 from gradia.ui.background_selector import BackgroundSelector
-from gradia.ui.image_exporters import ExportManager
+from gradia.ui.image_exporters import ExportManager, ExportCache, BAND_BYTES_PER_PIXEL
 from gradia.ui.image_loaders import ImportManager
-from gradia.graphics.loaded_image import LoadedImage, ImageOrigin
+from gradia.graphics.loaded_image import LoadedImage, ImageOrigin, resident_images
 from gradia.ui.image_sidebar import ImageSidebar, ImageOptions
 from gradia.ui.image_stack import ImageStack
 from gradia.ui.ui_parts import *
@@ -40,6 +40,8 @@ from gradia.ui.welcome_page import WelcomePage
 from gradia.utils.aspect_ratio import *
 from gradia.ui.preferences.preferences_window import PreferencesWindow
 from gradia.backend.settings import Settings
+from gradia.backend.render_scheduler import RenderScheduler, SpeculativeRenderer
+from gradia.backend.tracing import tracer
 from gradia.constants import rootdir, build_type # pyright: ignore
 from gradia.ui.dialog.delete_screenshots_dialog import DeleteScreenshotsDialog
 from gradia.ui.dialog.confirm_close_dialog import ConfirmCloseDialog
@@ -86,16 +88,23 @@ class GradiaMainWindow(Adw.ApplicationWindow):
         self.file_path: Optional[str] = file_path
         self.image: Optional[LoadedImage] = None
         self.processed_pixbuf: Optional[Gdk.Pixbuf] = None
+        self._render_lock = threading.Lock()
         self.image_ready = False
         self.show_close_confirmation = False
 
         self.export_manager: ExportManager = ExportManager(self, temp_dir)
+        self.export_cache: ExportCache = ExportCache()
+        self._edit_generation = 0
+        self._edit_state: Optional[tuple] = None
+        self._edit_lock = threading.Lock()
         self.import_manager: ImportManager = ImportManager(self, temp_dir, self.app)
 
         if build_type == "debug":
             self.add_css_class("devel")
 
         self.processor: ImageProcessor = ImageProcessor()
+        self.render_scheduler: RenderScheduler = RenderScheduler(self._render_preview, self._on_preview_rendered)
+        self.speculative_renderer: SpeculativeRenderer = SpeculativeRenderer(self._render_full_resolution)
         self._setup_actions()
         self._setup_image_stack()
         self._setup_sidebar()
@@ -169,6 +178,9 @@ class GradiaMainWindow(Adw.ApplicationWindow):
 
         self.create_action("set-screenshot-folder",  lambda action, param: self.set_screenshot_folder(param.get_string()), vt="s")
 
+        if build_type == "debug":
+            self.create_action("record-trace", self._on_record_trace_activated, ["<Primary><Shift><Alt>t"])
+
 
     """
     Setup Methods
@@ -233,11 +245,8 @@ class GradiaMainWindow(Adw.ApplicationWindow):
             self._on_close_finished()
 
     def _on_close_finished(self) -> None:
-        def delayed_destroy():
-            self.destroy()
-            return False
-        self.hide()
-        GLib.timeout_add(1000, delayed_destroy) # Large images need the extra milliseconds to be fully copied.
+        self.speculative_renderer.cancel()
+        self.destroy()
 
     def _on_confirm_close_ok(self) -> None:
         self._finalize_close(copy=False)
@@ -250,25 +259,9 @@ class GradiaMainWindow(Adw.ApplicationWindow):
     """
 
     def on_image_options_changed(self, options: ImageOptions):
-        self.processor.background = options.background
-        self.processor.padding = options.padding
-        self.processor.corner_radius = options.corner_radius
-
-        try:
-            ratio: Optional[float] = parse_aspect_ratio(options.aspect_ratio)
-            if ratio is None:
-                self.processor.aspect_ratio = None
-            else:
-                if not check_aspect_ratio_bounds(ratio):
-                    raise ValueError(f"Aspect ratio must be between 0.2 and 5 (got {ratio})")
-                self.processor.aspect_ratio = ratio
-        except Exception as e:
-            print(f"Invalid aspect ratio: {options.aspect_ratio} ({e})")
-
-        self.processor.shadow_strength = options.shadow_strength
-        self.processor.auto_balance = options.auto_balance
-        self.processor.rotation = options.rotation
-
+        # Applied right away, so exports started before the next preview already use them.
+        with self._render_lock:
+            self._apply_image_options(options)
         self._trigger_processing()
 
     def _on_about_activated(self, action: Gio.SimpleAction, param: GObject.ParamSpec) -> None:
@@ -282,6 +275,21 @@ class GradiaMainWindow(Adw.ApplicationWindow):
         dialog.hide()
         return True
 
+    def _on_record_trace_activated(self, action: Gio.SimpleAction, param: GObject.ParamSpec) -> None:
+        if not tracer.enabled:
+            tracer.start()
+            self._show_notification(_("Recording trace"))
+            return
+
+        trace_dir = os.path.join(GLib.get_user_cache_dir(), "gradia", "traces")
+        os.makedirs(trace_dir, exist_ok=True)
+        trace_path = os.path.join(trace_dir, f"trace-{GLib.DateTime.new_now_local().format('%Y%m%d-%H%M%S')}.json")
+        try:
+            tracer.dump(trace_path)
+            self._show_notification(_("Trace saved to {path}").format(path=trace_path))
+        except OSError as e:
+            print(f"Failed to write trace: {e}")
+
     """
     Public Methods
     """
@@ -339,12 +347,27 @@ class GradiaMainWindow(Adw.ApplicationWindow):
     def show(self) -> None:
         self.present()
 
+    def get_edit_generation(self) -> int:
+        """
+        A number that increases whenever the export would change: the image
+        or its options, the annotations or the crop.
+        """
+        state = (
+            self.processor.get_render_key(),
+            self.drawing_overlay.generation,
+            self.image_bin.crop_overlay.get_crop_rectangle(),
+        )
+        with self._edit_lock:
+            if state != self._edit_state:
+                self._edit_state = state
+                self._edit_generation += 1
+            return self._edit_generation
+
     def process_image(self, callback=None) -> None:
         if not self.image:
             return
-        def worker():
-            self._process_in_background(callback)
-        threading.Thread(target=worker, daemon=True).start()
+        self.speculative_renderer.cancel()
+        self.render_scheduler.request(callback)
 
     """
     Private Methods
@@ -387,34 +410,74 @@ class GradiaMainWindow(Adw.ApplicationWindow):
         if self.image:
             self.process_image()
 
-    def _process_in_background(self, callback=None) -> None:
+    def _apply_image_options(self, options: ImageOptions) -> None:
+        self.processor.background = options.background
+        self.processor.padding = options.padding
+        self.processor.corner_radius = options.corner_radius
+
         try:
-            if self.image is not None:
-                self.processor.set_image(self.image)
-                pixbuf, true_width, true_height = self.processor.process()
-                self._update_processed_image_size(true_width, true_height)
-                self.processed_pixbuf = pixbuf
+            ratio: Optional[float] = parse_aspect_ratio(options.aspect_ratio)
+            if ratio is None:
+                self.processor.aspect_ratio = None
             else:
-                print("No image path set for processing.")
+                if not check_aspect_ratio_bounds(ratio):
+                    raise ValueError(f"Aspect ratio must be between 0.2 and 5 (got {ratio})")
+                self.processor.aspect_ratio = ratio
+        except Exception as e:
+            print(f"Invalid aspect ratio: {options.aspect_ratio} ({e})")
 
-            def finish():
-                self._update_image_preview()
-                if callback:
-                    callback()
-                return False
+        self.processor.shadow_strength = options.shadow_strength
+        self.processor.auto_balance = options.auto_balance
+        self.processor.rotation = options.rotation
 
-            GLib.idle_add(finish, priority=GLib.PRIORITY_DEFAULT)
+    def _render_preview(self) -> tuple[GdkPixbuf.Pixbuf, int, int]:
+        # Render a snapshot of the options, so they can change on the main thread meanwhile.
+        with self._render_lock:
+            self.processor.set_image(self.image)
+            processor = self.processor.snapshot()
+        return processor.process()
+
+    def _on_preview_rendered(self, result: tuple[GdkPixbuf.Pixbuf, int, int]) -> None:
+        pixbuf, true_width, true_height = result
+        self._update_processed_image_size(true_width, true_height)
+        self.processed_pixbuf = pixbuf
+        self._update_image_preview()
+        self.speculative_renderer.schedule()
+
+    def _render_full_resolution(self, cancellable: Gio.Cancellable) -> None:
+        # Render ahead of an export, so copying and saving can reuse the result,
+        # but only when the render and any decode it needs fit the memory budgets.
+        width, height = self.processor.estimate_full_resolution_size()
+        if width * height * BAND_BYTES_PER_PIXEL > self.settings.export_tile_budget * 1024 * 1024:
+            return
 
-        except Exception as e:
-            print(f"Error processing image: {e}")
+        needed_bytes = width * height * 4
+        if not self.image.is_decoded:
+            source_width, source_height = self.image.full_res_size
+            needed_bytes += source_width * source_height * 4
+        if not resident_images.has_room(needed_bytes):
+            return
+        self.processor.process_full_resolution(cancellable)
 
     def _update_image_preview(self) -> bool:
         if self.processed_pixbuf:
-            paintable: Gdk.Paintable = Gdk.Texture.new_for_pixbuf(self.processed_pixbuf)
+            paintable: Gdk.Paintable = self._texture_for_pixbuf(self.processed_pixbuf)
             self.picture.set_paintable(paintable)
             self._hide_loading_state()
         return False
 
+    def _texture_for_pixbuf(self, pixbuf: GdkPixbuf.Pixbuf) -> Gdk.Texture:
+        # Share the pixbuf's pixel bytes with the texture rather than copying them.
+        if pixbuf.get_has_alpha() and pixbuf.get_n_channels() == 4:
+            return Gdk.MemoryTexture.new(
+                pixbuf.get_width(),
+                pixbuf.get_height(),
+                Gdk.MemoryFormat.R8G8B8A8,
+                pixbuf.read_pixel_bytes(),
+                pixbuf.get_rowstride()
+            )
+        return Gdk.Texture.new_for_pixbuf(pixbuf)
+
     def _update_processed_image_size(self, width, height) -> None:
         size_str: str = f"{width}×{height}"
         self.sidebar.processed_size_row.set_subtitle(size_str)
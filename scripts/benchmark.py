@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Alexander Vanhee
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Benchmark the ImageProcessor render path, headless.
+
+Runs process() and process_full_resolution() over a matrix of input sizes,
+backgrounds and image options, each case in its own process so peak RSS is
+per case. Results are printed and written as JSON for comparing releases.
+
+Gradia has to be built first, since the gradient library, the generated
+constants and the resources come from the build:
+
+    meson setup builddir && meson install -C builddir --destdir=/tmp/gradia
+    python3 scripts/benchmark.py --pkgdatadir=/tmp/gradia/usr/local/share/gradia
+"""
+
+import argparse
+import gettext
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+SIZES = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+    "8k": (7680, 4320),
+    "tall": (1080, 20000),
+}
+
+BACKGROUNDS = ["linear", "conic", "radial", "solid", "image", "none"]
+
+# Every background is measured at each size with the default options, and
+# the option sweep runs on a single size so the matrix stays tractable.
+DEFAULT_OPTIONS = {"shadow_strength": 5, "corner_radius": 2, "auto_balance": False}
+SWEEP_SIZE = "1080p"
+SWEEP_BACKGROUND = "linear"
+SHADOW_STRENGTHS = [0, 5, 10]
+CORNER_RADII = [0, 2, 10]
+AUTO_BALANCE = [False, True]
+
+
+@dataclass
+class Case:
+    size: str
+    background: str
+    shadow_strength: int
+    corner_radius: int
+    auto_balance: bool
+    padding: int = 5
+
+    @property
+    def name(self) -> str:
+        return (
+            f"{self.size}/{self.background}/shadow={self.shadow_strength}"
+            f"/radius={self.corner_radius}/balance={int(self.auto_balance)}"
+        )
+
+
+@dataclass
+class CaseResult:
+    case: Case
+    preview_seconds: list[float] = field(default_factory=list)
+    full_seconds: list[float] = field(default_factory=list)
+    preview_stages: dict[str, float] = field(default_factory=dict)
+    full_stages: dict[str, float] = field(default_factory=dict)
+    output_size: tuple[int, int] = (0, 0)
+    peak_rss_mb: float = 0.0
+    error: Optional[str] = None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Gradia render path.")
+    parser.add_argument("--pkgdatadir", help="Directory of an installed gradia package, as used by the launcher")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="Comma separated input sizes")
+    parser.add_argument("--backgrounds", default=",".join(BACKGROUNDS), help="Comma separated backgrounds")
+    parser.add_argument("--no-sweep", action="store_true", help="Skip the shadow, radius and auto-balance sweep")
+    parser.add_argument("--repeat", type=int, default=3, help="Renders per case; the median is reported")
+    parser.add_argument("--output", default="benchmark.json", help="Path of the JSON report")
+    args = parser.parse_args()
+
+    _setup_gradia(args.pkgdatadir)
+
+    sizes = [size for size in args.sizes.split(",") if size]
+    backgrounds = [background for background in args.backgrounds.split(",") if background]
+    unknown = [size for size in sizes if size not in SIZES] + [bg for bg in backgrounds if bg not in BACKGROUNDS]
+    if unknown:
+        parser.error(f"Unknown sizes or backgrounds: {', '.join(unknown)}")
+
+    cases = _build_cases(sizes, backgrounds, sweep=not args.no_sweep)
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="gradia-benchmark-") as work_dir:
+        inputs = {size: _write_input(work_dir, size) for size in {case.size for case in cases}}
+        background_path = _write_background(work_dir)
+
+        for case in cases:
+            result = _run_isolated(case, inputs[case.size], background_path, args.repeat)
+            results.append(result)
+            _print_result(result)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": [_result_to_json(result) for result in results],
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    return 1 if any(result.error for result in results) else 0
+
+
+def _setup_gradia(pkgdatadir: Optional[str]) -> None:
+    import gi
+    gi.require_version("Gtk", "4.0")
+    gi.require_version("Adw", "1")
+    from gi.repository import Gio
+
+    gettext.install("gradia")
+    if pkgdatadir:
+        sys.path.insert(1, pkgdatadir)
+        resource_path = os.path.join(pkgdatadir, "gradia.gresource")
+        if os.path.exists(resource_path):
+            Gio.Resource.load(resource_path)._register()
+
+
+def _build_cases(sizes: list[str], backgrounds: list[str], sweep: bool) -> list[Case]:
+    cases = [Case(size, background, **DEFAULT_OPTIONS) for size in sizes for background in backgrounds]
+
+    if sweep:
+        for shadow_strength in SHADOW_STRENGTHS:
+            for corner_radius in CORNER_RADII:
+                for auto_balance in AUTO_BALANCE:
+                    case = Case(SWEEP_SIZE, SWEEP_BACKGROUND, shadow_strength, corner_radius, auto_balance)
+                    if case not in cases:
+                        cases.append(case)
+
+    return cases
+
+
+def _write_input(work_dir: str, size: str) -> str:
+    """A deterministic screenshot-like image: flat margins around blocky content."""
+    from PIL import Image, ImageDraw
+
+    width, height = SIZES[size]
+    rng = random.Random(size)
+    image = Image.new("RGB", (width, height), (246, 245, 244))
+    draw = ImageDraw.Draw(image)
+
+    margin = min(width, height) // 12
+    for _block in range(400):
+        x = rng.randrange(margin, width - margin)
+        y = rng.randrange(margin, height - margin)
+        block_width = rng.randrange(8, max(9, width // 6))
+        block_height = rng.randrange(4, max(5, height // 40))
+        color = tuple(rng.randrange(256) for _channel in range(3))
+        draw.rectangle(
+            (x, y, min(width - margin, x + block_width), min(height - margin, y + block_height)),
+            fill=color
+        )
+
+    path = os.path.join(work_dir, f"input-{size}.png")
+    image.save(path, compress_level=1)
+    return path
+
+
+def _write_background(work_dir: str) -> str:
+    from PIL import Image
+
+    path = os.path.join(work_dir, "background.png")
+    Image.radial_gradient("L").resize((1600, 1200)).convert("RGB").save(path)
+    return path
+
+
+def _run_isolated(case: Case, input_path: str, background_path: str, repeat: int) -> CaseResult:
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case, args=(sender, case, input_path, background_path, repeat))
+    process.start()
+    sender.close()
+
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = CaseResult(case, error=f"Benchmark process exited with code {process.exitcode}")
+    process.join()
+    return result
+
+
+def _run_case(sender, case: Case, input_path: str, background_path: str, repeat: int) -> None:
+    result = CaseResult(case)
+    try:
+        from gradia.graphics.image_processor import ImageProcessor
+        from gradia.graphics.loaded_image import LoadedImage, ImageOrigin
+
+        background = _create_background(case.background, background_path)
+
+        for _run in range(repeat):
+            image = LoadedImage(input_path, ImageOrigin.CommandLine)
+            if not image.is_loaded:
+                raise RuntimeError(image.load_error)
+
+            processor = ImageProcessor(
+                image=image,
+                background=background,
+                padding=case.padding if background else 0,
+                corner_radius=case.corner_radius,
+                shadow_strength=case.shadow_strength,
+                auto_balance=case.auto_balance
+            )
+
+            start = time.perf_counter()
+            processor.process()
+            result.preview_seconds.append(time.perf_counter() - start)
+            result.preview_stages = dict(processor.stage_timings)
+
+            start = time.perf_counter()
+            pixbuf = processor.process_full_resolution()
+            result.full_seconds.append(time.perf_counter() - start)
+            result.full_stages = dict(processor.stage_timings)
+            result.output_size = (pixbuf.get_width(), pixbuf.get_height())
+
+        result.peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception as e:
+        result.error = str(e)
+
+    sender.send(result)
+    sender.close()
+
+
+def _create_background(name: str, background_path: str):
+    from gradia.graphics.gradient import Gradient, GradientBackground
+    from gradia.graphics.image import ImageBackground
+    from gradia.graphics.solid import SolidBackground
+
+    if name == "none":
+        return None
+    if name == "solid":
+        return SolidBackground("#4A90E2")
+    if name == "image":
+        return ImageBackground(background_path)
+    return GradientBackground(Gradient(mode=name))
+
+
+def _print_result(result: CaseResult) -> None:
+    if result.error:
+        print(f"{result.case.name}: FAILED {result.error}")
+        return
+
+    stages = ", ".join(f"{stage} {seconds * 1000:.0f}" for stage, seconds in result.full_stages.items())
+    print(
+        f"{result.case.name}: preview {statistics.median(result.preview_seconds) * 1000:.0f} ms, "
+        f"full {statistics.median(result.full_seconds) * 1000:.0f} ms ({stages}), "
+        f"peak RSS {result.peak_rss_mb:.0f} MB"
+    )
+
+
+def _result_to_json(result: CaseResult) -> dict:
+    data = asdict(result)
+    data["name"] = result.case.name
+    if not result.error:
+        data["preview_median_seconds"] = statistics.median(result.preview_seconds)
+        data["full_median_seconds"] = statistics.median(result.full_seconds)
+    return data
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+import pytest
+
+gi = pytest.importorskip("gi")
+gi.require_version("Gtk", "4.0")
+gi.require_version("Adw", "1")
+pytest.importorskip("gradia.constants", reason="gradia is not configured with meson")
+
+from PIL import Image
+
+from gradia.graphics.image import ImageBackground
+
+
+@pytest.fixture
+def background(tmp_path):
+    path = tmp_path / "background.png"
+    Image.effect_mandelbrot((900, 700), (-2, -1.3, 1, 1.3), 60).convert("RGB").save(path)
+    return ImageBackground(str(path))
+
+
+@pytest.mark.parametrize("size", [(3001, 1777), (800, 2000)])
+@pytest.mark.parametrize("band_height", [100, 333, 1000])
+def test_bands_match_full_background(background, size, band_height):
+    width, height = size
+    full = background.prepare_image(width, height)
+
+    for top in range(0, height, band_height):
+        bottom = min(height, top + band_height)
+        band = background.prepare_band(width, height, top, bottom)
+        assert band.tobytes() == full.crop((0, top, width, bottom)).tobytes()
@@ -0,0 +1,34 @@
+import io
+
+import pytest
+
+gi = pytest.importorskip("gi")
+gi.require_version("Gtk", "4.0")
+gi.require_version("Adw", "1")
+pytest.importorskip("gradia.constants", reason="gradia is not configured with meson")
+
+from gi.repository import GdkPixbuf, GLib
+from PIL import Image
+
+from gradia.graphics.palette import encode_palette_png
+from gradia.ui.image_exporters import BaseImageExporter
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+def test_palette_png_from_cropped_region(tmp_path, mode):
+    image = Image.effect_mandelbrot((301, 200), (-2, -1, 1, 1), 40).convert(mode)
+    pixbuf = GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(image.tobytes()), GdkPixbuf.Colorspace.RGB, mode == "RGBA", 8,
+        image.width, image.height, image.width * len(mode)
+    )
+    box = (13, 20, 200, 170)
+    region = GdkPixbuf.Pixbuf.new_subpixbuf(pixbuf, box[0], box[1], box[2] - box[0], box[3] - box[1])
+
+    exporter = BaseImageExporter(None, str(tmp_path))
+    converted = exporter._pixbuf_to_image(region)
+    assert converted.tobytes() == image.crop(box).tobytes()
+
+    encoded = Image.open(io.BytesIO(encode_palette_png(converted)))
+    expected = Image.open(io.BytesIO(encode_palette_png(image.crop(box))))
+    assert encoded.mode == "P"
+    assert encoded.convert("RGBA").tobytes() == expected.convert("RGBA").tobytes()
@@ -0,0 +1,60 @@
+import pytest
+
+gi = pytest.importorskip("gi")
+gi.require_version("Gtk", "4.0")
+gi.require_version("Adw", "1")
+pytest.importorskip("gradia.constants", reason="gradia is not configured with meson")
+
+from PIL import Image
+
+from gradia.graphics.image import ImageBackground
+from gradia.graphics.image_processor import ImageProcessor
+from gradia.graphics.loaded_image import ImageOrigin, LoadedImage
+from gradia.graphics.solid import SolidBackground
+
+BOXES = [(10, 300, 700, 1000), (0, 0, None, 400), (5, 257, -3, None)]
+
+
+def pixbuf_to_bytes(pixbuf) -> bytes:
+    data = pixbuf.read_pixel_bytes().get_data()
+    rowstride = pixbuf.get_rowstride()
+    row_bytes = pixbuf.get_width() * pixbuf.get_n_channels()
+    return b"".join(data[y * rowstride:y * rowstride + row_bytes] for y in range(pixbuf.get_height()))
+
+
+@pytest.fixture
+def loaded_image(tmp_path):
+    path = tmp_path / "image.png"
+    Image.effect_mandelbrot((1200, 900), (-2, -1, 1, 1), 40).convert("RGB").save(path)
+    return LoadedImage(str(path), ImageOrigin.FileDialog)
+
+
+def make_image_background(tmp_path):
+    path = tmp_path / "background.png"
+    Image.effect_mandelbrot((900, 700), (-2, -1.3, 1, 1.3), 60).convert("RGB").save(path)
+    return ImageBackground(str(path))
+
+
+@pytest.mark.parametrize("background_type", ["none", "solid", "image"])
+@pytest.mark.parametrize("cached", [False, True])
+def test_region_matches_crop_of_full_render(tmp_path, loaded_image, background_type, cached):
+    background = {
+        "none": lambda: None,
+        "solid": lambda: SolidBackground("#4A90E2", 0.5),
+        "image": lambda: make_image_background(tmp_path),
+    }[background_type]()
+    processor = ImageProcessor(
+        image=loaded_image, background=background, padding=5, corner_radius=2, shadow_strength=5
+    )
+    full = processor.process_full_resolution_to_pillow()
+    if cached:
+        processor.process_full_resolution()
+    else:
+        processor.clear_cache()
+
+    for left, top, right, bottom in BOXES:
+        right = full.width if right is None else right % full.width
+        bottom = full.height if bottom is None else min(bottom, full.height)
+        box = (left, top, right, bottom)
+        region = processor.process_full_resolution_region(box)
+        assert pixbuf_to_bytes(region) == full.crop(box).tobytes()